@@ -0,0 +1,163 @@
+"""
+Synthetic account code catalogs for benchmarking.
+
+    python -m benchmarks.generate catalog.csv --rows 100000 --depth 6 --fan-out 8
+
+Catalogs are written in the layout import_account_codes reads and are reproducible, the same CatalogSpec always gives
+the same file.
+"""
+
+import argparse
+import random
+from csv import excel, writer
+from dataclasses import dataclass
+from itertools import accumulate, islice
+
+from models.exporter import CSV_COLUMNS, FALSY_VALUES
+from models.importer import FLAG_COLUMNS
+from models.notes import NOTES_CSV_COLUMNS
+
+MAX_DEPTH = 11  # deepest level the tree colors and real catalogs use
+MAX_FAN_OUT = 99  # below the top level segments are two digits
+
+# Word stems combined into the vocabulary, descriptions and notes draw from it with a Zipf like skew so a few words
+# are very common and most are rare, as in a real catalog
+STEMS = [
+    "aggregate", "anchor", "asphalt", "backfill", "barrier", "beam", "bearing", "bridge", "cable", "caisson",
+    "concrete", "conduit", "culvert", "curb", "deck", "drain", "embankment", "erosion", "excavation", "fence",
+    "footing", "formwork", "girder", "grading", "guardrail", "hydrant", "joint", "lighting", "manhole", "membrane",
+    "paving", "pier", "pile", "pipe", "precast", "rebar", "retaining", "riprap", "seeding", "sign",
+    "signal", "slab", "sleeve", "steel", "striping", "subbase", "timber", "trench", "valve", "wall",
+]  # fmt: skip
+SUFFIXES = ["", "s", "ing", "ed", "work", "type", "class", "grade"]
+UNITS = [("CY", "M3"), ("SY", "M2"), ("LF", "M"), ("EA", "EA"), ("TON", "T"), ("LS", "LS"), ("GAL", "L")]
+
+
+@dataclass(frozen=True)
+class CatalogSpec:
+    rows: int
+    depth: int = 6  # levels below and including the top level, at most MAX_DEPTH
+    fan_out: int = 8  # children of every code above the last level
+    description_words: int = 6
+    notes_words: int = 12  # words of district notes, 0 for none
+    notes_density: float = 0.3  # fraction of codes with district notes
+    flag_density: float = 0.25  # chance of each flag being set
+    seed: int = 1
+
+    def __post_init__(self):
+        if not 1 <= self.depth <= MAX_DEPTH:
+            raise ValueError(f"depth must be between 1 and {MAX_DEPTH}")
+        if not 1 <= self.fan_out <= MAX_FAN_OUT:
+            raise ValueError(f"fan_out must be between 1 and {MAX_FAN_OUT}")
+        if self.rows < 1:
+            raise ValueError("rows must be at least 1")
+
+    @property
+    def subtree_size(self):
+        """Codes under, and including, one top level code"""
+        return sum(self.fan_out**level for level in range(self.depth))
+
+
+VOCABULARY = [stem + suffix for suffix in SUFFIXES for stem in STEMS]
+# Cumulative Zipf weights, the n-th word is 1 / n as likely as the first
+VOCABULARY_WEIGHTS = list(accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+
+
+def words(rng, count):
+    return " ".join(rng.choices(VOCABULARY, cum_weights=VOCABULARY_WEIGHTS, k=count))
+
+
+def subtree_codes(code, depth, fan_out):
+    """code followed by its descendants depth - 1 levels deep, parents before their children"""
+    yield code
+    if depth > 1:
+        for child in range(1, fan_out + 1):
+            yield from subtree_codes(f"{code}.{child:02d}", depth - 1, fan_out)
+
+
+def account_codes(spec):
+    """spec.rows account codes in account code order, as many top level subtrees as needed, the last one cut short"""
+    top_levels = -(-spec.rows // spec.subtree_size)
+    codes = (
+        code
+        for top_level in range(1, top_levels + 1)
+        for code in subtree_codes(f"{top_level:02d}", spec.depth, spec.fan_out)
+    )
+    return islice(codes, spec.rows)
+
+
+def catalog_rows(spec):
+    """The CSV rows of the catalog, header excluded"""
+    rng = random.Random(spec.seed)
+    flags = [(truthy, FALSY_VALUES[truthy]) for _, truthy in FLAG_COLUMNS.values()]
+    for code in account_codes(spec):
+        uom, metric_uom = rng.choice(UNITS)
+        uom2, metric_uom2 = rng.choice(UNITS)
+        notes = words(rng, spec.notes_words) if spec.notes_words and rng.random() < spec.notes_density else ""
+        yield [
+            code,
+            words(rng, spec.description_words),
+            uom,
+            uom2,
+            metric_uom,
+            metric_uom2,
+            notes,
+            *(truthy if rng.random() < spec.flag_density else falsy for truthy, falsy in flags),
+        ]
+
+
+def write_catalog_csv(file_path, spec):
+    with open(file_path, "w", newline="") as f:
+        csv_writer = writer(f, dialect=excel)
+        csv_writer.writerow(CSV_COLUMNS)
+        csv_writer.writerows(catalog_rows(spec))
+
+
+def write_notes_csv(file_path, spec, density=0.1, author="Benchmark", date="2024-01-01"):
+    """A personal notes export for about density of the codes of spec, as export_notes writes it"""
+    rng = random.Random(spec.seed + 1)
+    count = 0
+    with open(file_path, "w", newline="") as f:
+        csv_writer = writer(f, dialect=excel)
+        csv_writer.writerow(NOTES_CSV_COLUMNS)
+        for code in account_codes(spec):
+            if rng.random() < density:
+                csv_writer.writerow([code, words(rng, rng.randint(3, 30)), author, date])
+                count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic account code CSV")
+    parser.add_argument("file", help="CSV file to write")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--depth", type=int, default=CatalogSpec.depth, help=f"Levels, at most {MAX_DEPTH}")
+    parser.add_argument("--fan-out", type=int, default=CatalogSpec.fan_out, help="Children per code")
+    parser.add_argument("--description-words", type=int, default=CatalogSpec.description_words)
+    parser.add_argument("--notes-words", type=int, default=CatalogSpec.notes_words)
+    parser.add_argument("--notes-density", type=float, default=CatalogSpec.notes_density)
+    parser.add_argument("--flag-density", type=float, default=CatalogSpec.flag_density)
+    parser.add_argument("--seed", type=int, default=CatalogSpec.seed)
+    parser.add_argument("--personal-notes", help="Also write a personal notes CSV for 10%% of the codes")
+    args = parser.parse_args(argv)
+
+    try:
+        spec = CatalogSpec(
+            rows=args.rows,
+            depth=args.depth,
+            fan_out=args.fan_out,
+            description_words=args.description_words,
+            notes_words=args.notes_words,
+            notes_density=args.notes_density,
+            flag_density=args.flag_density,
+            seed=args.seed,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    write_catalog_csv(args.file, spec)
+    if args.personal_notes:
+        write_notes_csv(args.personal_notes, spec)
+
+
+if __name__ == "__main__":
+    main()
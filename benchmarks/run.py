@@ -0,0 +1,214 @@
+"""
+Time the catalog operations on synthetic catalogs of increasing size.
+
+    python -m benchmarks.run --sizes 10000 100000 1000000 --output results.json
+
+Every size gets a fresh database in a temporary directory. The operations run through the services the GUI and CLI
+use, so results track what users see. Results are written as JSON, one measurement per operation and size, with the
+environment they were taken in, to be compared between releases.
+"""
+
+import argparse
+import json
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, replace
+from datetime import datetime, timezone
+from pathlib import Path
+
+from constants import FlagMatch, SortMode, version
+from models import SearchCache
+from services import CatalogService, NotesService, SearchRequest, SearchService
+from .generate import VOCABULARY, CatalogSpec, write_catalog_csv, write_notes_csv
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_REPEAT = 5
+
+# Searches to time in both sort modes, from a word in most descriptions to a flag only filter
+SEARCHES = {
+    "common_word": SearchRequest(VOCABULARY[0]),
+    "rare_word": SearchRequest(VOCABULARY[-1]),
+    "two_words": SearchRequest(f"{VOCABULARY[1]} {VOCABULARY[2]}"),
+    "prefix": SearchRequest(VOCABULARY[3][:3], live=True),
+    "word_and_flags": SearchRequest(VOCABULARY[0], flags=("has_labor_cost", "has_ga_cost"), flag_match=FlagMatch.ALL),
+    "flags_only": SearchRequest("", flags=("has_materials_cost",)),
+}
+
+
+class Results:
+    """Collects measurements as flat records, {"rows", "name", "seconds", ...}"""
+
+    def __init__(self, quiet=False):
+        self.measurements = []
+        self.quiet = quiet
+
+    def add(self, rows, name, seconds, **extra):
+        self.measurements.append({"rows": rows, "name": name, "seconds": round(seconds, 6), **extra})
+        if not self.quiet:
+            details = " ".join(f"{key}={value}" for key, value in extra.items())
+            print(f"{rows:>9} {name:<52} {seconds:9.4f}s {details}", file=sys.stderr, flush=True)
+
+    def time(self, rows, name, function, repeat=1, **extra):
+        """Run function repeat times and record the median, returns the last result"""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            timings.append(time.perf_counter() - start)
+        if repeat > 1:
+            extra = {"repeat": repeat, "min": round(min(timings), 6), **extra}
+        self.add(rows, name, statistics.median(timings), **extra)
+        return result
+
+
+def benchmark_size(spec, workdir, results, repeat):
+    rows = spec.rows
+    catalog_csv = workdir / f"catalog_{rows}.csv"
+    notes_csv = workdir / f"notes_{rows}.csv"
+    results.time(rows, "generate.catalog_csv", lambda: write_catalog_csv(catalog_csv, spec))
+    notes = results.time(rows, "generate.notes_csv", lambda: write_notes_csv(notes_csv, spec))
+
+    catalog = CatalogService()
+    catalog.open(workdir / f"catalog_{rows}.sqlite")
+    try:
+        results.time(rows, "import.full", lambda: catalog.import_account_codes(catalog_csv))
+        results.time(rows, "import.merge_unchanged", lambda: catalog.import_account_codes(catalog_csv, merge=True))
+        results.time(rows, "index.rebuild", catalog.rebuild_index)
+        results.time(rows, "index.ensure_current", catalog.ensure_index, repeat)
+
+        benchmark_search(rows, results, repeat)
+        benchmark_hierarchy(catalog, rows, results, repeat)
+
+        results.time(rows, "export.csv", lambda: catalog.export_account_codes(workdir / f"export_{rows}.csv"))
+        results.time(rows, "export.jsonl", lambda: catalog.export_account_codes(workdir / f"export_{rows}.jsonl"))
+
+        notes_service = NotesService()
+        results.time(rows, "notes.import", lambda: notes_service.import_notes(notes_csv), notes=notes)
+        results.time(rows, "notes.export_csv", lambda: notes_service.export_notes(workdir / f"notes_{rows}_out.csv"))
+        results.time(rows, "notes.export_json", lambda: notes_service.export_notes(workdir / f"notes_{rows}_out.json"))
+        results.time(
+            rows,
+            "notes.export_csv_filtered",
+            lambda: notes_service.export_notes(
+                workdir / f"notes_{rows}_filtered.csv", author="Benchmark", only_author=True
+            ),
+        )
+    finally:
+        catalog.close()
+
+
+def benchmark_search(rows, results, repeat):
+    # A cache of its own that is emptied before every run, so every page is fetched cold
+    cache = SearchCache()
+    search = SearchService(cache=cache)
+
+    def first_page(request):
+        cache.clear()
+        return search.page(request)
+
+    def page_after(request, cursor):
+        cache.clear()
+        return search.page(request, after=cursor)
+
+    for name, base in SEARCHES.items():
+        for sort_mode in SortMode:
+            request = replace(base, sort_mode=sort_mode)
+            prefix = f"search.{name}.{sort_mode.name.lower()}"
+            _, cursor = results.time(rows, f"{prefix}.first_page", lambda request=request: first_page(request), repeat)
+            if cursor is not None:
+                results.time(
+                    rows,
+                    f"{prefix}.next_page",
+                    lambda request=request, cursor=cursor: page_after(request, cursor),
+                    repeat,
+                )
+        results.time(rows, f"search.{name}.count", lambda base=base: search.count(base), repeat)
+
+
+def benchmark_hierarchy(catalog, rows, results, repeat):
+    # Lazy tree, the top level and then the children of the first code as its node is opened
+    top = results.time(rows, "tree.lazy.top_level", lambda: list(catalog.child_records(None)), repeat)
+    if top:
+        first, _ = top[0]
+        results.time(rows, "tree.lazy.open_node", lambda: list(catalog.child_records(first.account_code)), repeat)
+    # Eager tree and the type ahead index, every code at once
+    results.time(rows, "tree.eager.records", lambda: list(catalog.records()), repeat)
+    results.time(rows, "tree.type_ahead.labels", lambda: list(catalog.labels()), repeat)
+    catalog.use_snapshot = True
+    try:
+        results.time(rows, "tree.snapshot.load", catalog.load_snapshot, repeat)
+        results.time(rows, "tree.snapshot.records", lambda: list(catalog.records()), repeat)
+    finally:
+        catalog.use_snapshot = False
+        catalog.load_snapshot()
+
+
+def environment():
+    return {
+        "version": version,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the catalog operations on synthetic catalogs")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Catalog sizes in rows")
+    parser.add_argument("--depth", type=int, default=CatalogSpec.depth)
+    parser.add_argument("--fan-out", type=int, default=CatalogSpec.fan_out)
+    parser.add_argument("--description-words", type=int, default=CatalogSpec.description_words)
+    parser.add_argument("--notes-words", type=int, default=CatalogSpec.notes_words)
+    parser.add_argument("--notes-density", type=float, default=CatalogSpec.notes_density)
+    parser.add_argument("--flag-density", type=float, default=CatalogSpec.flag_density)
+    parser.add_argument("--seed", type=int, default=CatalogSpec.seed)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs of the quick operations")
+    parser.add_argument("--workdir", help="Keep the generated files here instead of a temporary directory")
+    parser.add_argument("--output", help="JSON file for the results, printed to stdout by default")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Don't print measurements as they are taken")
+    args = parser.parse_args(argv)
+
+    results = Results(args.quiet)
+    try:
+        specs = [
+            CatalogSpec(
+                rows=rows,
+                depth=args.depth,
+                fan_out=args.fan_out,
+                description_words=args.description_words,
+                notes_words=args.notes_words,
+                notes_density=args.notes_density,
+                flag_density=args.flag_density,
+                seed=args.seed,
+            )
+            for rows in args.sizes
+        ]
+    except ValueError as e:
+        parser.error(str(e))
+    with tempfile.TemporaryDirectory(prefix="ace_benchmark_") as temporary:
+        workdir = Path(args.workdir or temporary)
+        workdir.mkdir(parents=True, exist_ok=True)
+        for spec in specs:
+            benchmark_size(spec, workdir, results, args.repeat)
+
+    report = {
+        "environment": environment(),
+        "parameters": {key: value for key, value in asdict(specs[0]).items() if key != "rows"},
+        "sizes": args.sizes,
+        "measurements": results.measurements,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
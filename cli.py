@@ -0,0 +1,268 @@
+"""
+Headless entry point for batch jobs, the same models and import/export code as the GUI without tkinter.
+
+    python cli.py import codes.csv --merge
+    python cli.py export codes.csv.gz
+    python cli.py reindex
+    python cli.py search "concrete footing" --field description --flag has_labor_cost
+    python cli.py stats
+
+The database is taken from --database or the path in the config file the GUI would load. Progress is written to
+stderr, results to stdout, the exit code is one of the EXIT_ constants.
+"""
+
+import argparse
+import configparser
+import json
+import os
+import sys
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+from constants import AccountCodeFlags, FlagMatch, SortMode
+from models import DEFAULT_BATCH_SIZE, EXPORT_FORMATS, SEARCH_FIELDS, OperationCancelled
+from services import CatalogService, SearchRequest, SearchService
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2  # argparse exits with 2 on invalid arguments as well
+EXIT_CANCELLED = 130  # interrupted with Ctrl+C, the shell convention for SIGINT
+
+PROGRESS_INTERVAL = 0.5
+
+
+def config_paths():
+    """Config files in the order ExplorerApp.config_load looks for them"""
+    paths = [Path("./config.ini")]
+    appdata = os.getenv("APPDATA")
+    if appdata:
+        paths += [Path(appdata) / "Account Code Explorer" / name for name in ("config.ini", "default_config.ini")]
+    return paths
+
+
+def load_config():
+    """The first config file found, or an empty config when there is none"""
+    config = configparser.ConfigParser()
+    for path in config_paths():
+        if path.exists():
+            config.read(path)
+            break
+    return config
+
+
+def import_batch_size(config):
+    try:
+        return int(config.get("import", "batch_size", fallback=DEFAULT_BATCH_SIZE))
+    except ValueError:
+        report("Invalid import batch size. Using default batch size.")
+        return DEFAULT_BATCH_SIZE
+
+
+def report(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def progress_printer(label, quiet=False):
+    """
+    A progress(rows, done, total) callback printing the row count and done / total as a percentage to stderr, at most
+    every PROGRESS_INTERVAL seconds
+    """
+    last = 0.0
+
+    def progress(rows, done, total):
+        nonlocal last
+        now = time.perf_counter()
+        if quiet or now - last < PROGRESS_INTERVAL:
+            return
+        last = now
+        percent = f" ({done / total:.0%})" if total else ""
+        report(f"{label} {rows}{percent}")
+
+    return progress
+
+
+def database_init(catalog, db_path, quiet=False):
+    def on_migration_progress(number, total, description):
+        if not quiet:
+            report(f"Upgrading database ({number}/{total}): {description}...")
+
+    result = catalog.open(db_path, progress=on_migration_progress)
+    if result.reindexed and not quiet:
+        report("Search index was out of date, index rebuilt")
+    return result
+
+
+#########################################################################
+# Commands
+#########################################################################
+
+
+def command_import(catalog, args):
+    batch_size = args.batch_size or import_batch_size(args.config)
+    # The import reports (rows, bytes read, total bytes), the percentage is how far through the file it is
+    progress = progress_printer("Importing account codes...", args.quiet)
+    result = catalog.import_account_codes(args.file, args.merge, batch_size, progress=progress)
+    if result.merged:
+        report(
+            f"Merged {result.rows} account codes in {result.elapsed:.1f}s: {result.inserted} added, "
+            f"{result.updated} changed, {result.deleted} removed"
+        )
+        if result.deleted_notes:
+            report(f"Warning: {result.deleted_notes} removed account codes had personal notes, they were deleted")
+    else:
+        report(f"Imported {result.rows} account codes in {result.elapsed:.1f}s ({result.rows_per_second:.0f} rows/s)")
+    if result.duplicates:
+        report(f"Warning: {result.duplicates} rows repeated an account code, the last row of each code was kept")
+    return EXIT_OK
+
+
+def command_export(catalog, args):
+    printer = progress_printer("Exporting account codes...", args.quiet)
+    result = catalog.export_account_codes(args.file, progress=lambda rows, total: printer(rows, rows, total))
+    report(f"Exported {result.rows} account codes in {result.elapsed:.1f}s ({result.rows_per_second:.0f} rows/s)")
+    return EXIT_OK
+
+
+def command_reindex(catalog, args):
+    # Opening the database already rebuilt a stale index
+    start = time.perf_counter()
+    if args.force:
+        catalog.rebuild_index()
+        report(f"Search index rebuilt in {time.perf_counter() - start:.1f}s")
+    elif not args.opened.reindexed:
+        report("Search index is already up to date")
+    return EXIT_OK
+
+
+def command_search(catalog, args):
+    request = SearchRequest(
+        " ".join(args.terms),
+        fields=tuple(args.fields or SEARCH_FIELDS),
+        flags=tuple(args.flags) if args.flags else None,
+        flag_match=FlagMatch[args.match.upper()],
+        sort_mode=SortMode[args.sort.upper()],
+    )
+    if request.is_empty:
+        report("Nothing to search for, give search terms or at least one --flag")
+        return EXIT_USAGE
+
+    search = SearchService()
+    if args.count:
+        print(search.count(request))
+        return EXIT_OK
+
+    rows = 0
+    for record in search.results(request, limit=args.limit or None):
+        if args.json:
+            print(json.dumps({field: getattr(record, field) for field in ("account_code", "level", "description")}))
+        else:
+            print(f"{record.account_code}\t{record.description}")
+        rows += 1
+    report(f"{rows} account codes found")
+    return EXIT_OK
+
+
+def command_stats(catalog, args):
+    stats = asdict(catalog.stats())
+    if args.json:
+        print(json.dumps(stats, indent=4))
+        return EXIT_OK
+
+    for key in ["database", "size_bytes", "schema_version", "search_index_current", "account_codes", "personal_notes"]:
+        print(f"{key}: {stats[key]}")
+    print("levels:")
+    for level, count in stats["levels"].items():
+        print(f"    {level}: {count}")
+    print("flags:")
+    for flag, count in stats["flags"].items():
+        print(f"    {flag}: {count}")
+    return EXIT_OK
+
+
+#########################################################################
+# Argument Parsing
+#########################################################################
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Account Code Explorer command line interface")
+    parser.add_argument("--database", help="SQLite database to use, defaults to the one in the config file")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Don't print progress")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Import an account code CSV")
+    import_parser.add_argument("file", help="Account code CSV")
+    import_parser.add_argument(
+        "--merge", action="store_true", help="Only apply the changed codes, keeping personal notes"
+    )
+    import_parser.add_argument("--batch-size", type=int, default=None, help="Rows per insert batch")
+    import_parser.set_defaults(handler=command_import, create=True)
+
+    export_parser = commands.add_parser("export", help="Export the account codes")
+    export_parser.add_argument(
+        "file", help=f"Output file, the format follows the extension: {', '.join(EXPORT_FORMATS)}"
+    )
+    export_parser.set_defaults(handler=command_export)
+
+    reindex_parser = commands.add_parser("reindex", help="Rebuild the search index if it is out of date")
+    reindex_parser.add_argument("--force", action="store_true", help="Rebuild even if the index is current")
+    reindex_parser.set_defaults(handler=command_reindex)
+
+    search_parser = commands.add_parser("search", help="Search the account codes")
+    search_parser.add_argument("terms", nargs="*", help="FTS5 search terms, any word in any field matches")
+    search_parser.add_argument(
+        "--field", dest="fields", action="append", choices=SEARCH_FIELDS, help="Field to search, repeatable"
+    )
+    search_parser.add_argument(
+        "--flag", dest="flags", action="append", default=[], choices=AccountCodeFlags, help="Flag filter, repeatable"
+    )
+    search_parser.add_argument(
+        "--match", choices=[match.name.lower() for match in FlagMatch], default="any", help="How flags combine"
+    )
+    search_parser.add_argument(
+        "--sort", choices=[mode.name.lower() for mode in SortMode], default="relevance", help="Result order"
+    )
+    search_parser.add_argument("--limit", type=int, default=50, help="Maximum results, 0 for all")
+    search_parser.add_argument("--count", action="store_true", help="Only print the number of matches")
+    search_parser.add_argument("--json", action="store_true", help="Print JSON Lines")
+    search_parser.set_defaults(handler=command_search)
+
+    stats_parser = commands.add_parser("stats", help="Summarize the catalog")
+    stats_parser.add_argument("--json", action="store_true", help="Print JSON")
+    stats_parser.set_defaults(handler=command_stats)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    args.config = load_config()
+    db_path = args.database or args.config.get("database", "path", fallback="")
+    if not db_path:
+        report("No database given and none configured, pass --database")
+        return EXIT_USAGE
+    # Only an import may start a new database, and only once the file to import is known to exist
+    if args.command == "import" and not Path(args.file).exists():
+        report(f"File not found: {args.file}")
+        return EXIT_ERROR
+    if not getattr(args, "create", False) and not Path(db_path).exists():
+        report(f"Database not found: {db_path}")
+        return EXIT_ERROR
+
+    catalog = CatalogService()
+    try:
+        args.opened = database_init(catalog, db_path, args.quiet)
+        return args.handler(catalog, args)
+    except (KeyboardInterrupt, OperationCancelled):
+        report("Cancelled")
+        return EXIT_CANCELLED
+    except Exception as e:
+        report(f"Error: {e}")
+        return EXIT_ERROR
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -50,3 +50,9 @@ class LeftPanelMode(Enum):
 class SortMode(Enum):
     RELEVANCE = 0
     ACCOUNT_CODE = 1
+
+
+class FlagMatch(Enum):
+    ANY = 0
+    ALL = 1
+    NONE = 2
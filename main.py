@@ -2,18 +2,18 @@ import configparser
 import json
 import os
 import re
-import threading
 import tkinter as tk
-from csv import DictReader, DictWriter, excel
 from pathlib import Path
 from tkinter import filedialog, ttk, BooleanVar, IntVar, messagebox
 
 import screeninfo
 
 from constants import LeftPanelMode
-from models import AccountCode, AccountCodeIndex, db
-from popups import ExportPopup, ImportPopup, AboutPopup
+from models import DEFAULT_BATCH_SIZE
+from popups import ExportPopup, ImportPopup, AboutPopup, ProgressPopup
+from services import CatalogService, NotesService, SearchService
 from widgets import TreePanel, DetailView, SearchView
+from workers import ExportWorker, ImportWorker
 
 
 class ExplorerApp:
@@ -27,19 +27,25 @@ class ExplorerApp:
         # Set the icon
         self.root.iconbitmap("AccountCodeExplorer.ico")
 
+        # The widgets only talk to the catalog through these
+        self.catalog = CatalogService()
+        self.notes = NotesService()
+        self.search = SearchService()
+
         # Create a PanedWindow
         self.paned_window = ttk.PanedWindow(root, orient=tk.HORIZONTAL)
 
         # Create the search panel frame
-        self.search_view = SearchView(self.paned_window, padding=5)
+        self.search_view = SearchView(self.paned_window, self.search, padding=5)
+        self.search_view.status_command = self.update_status
         self.search_view.pack(fill=tk.BOTH, expand=True)
         self.paned_window.add(self.search_view)
 
         # Create the side drawer frame
-        self.tree_panel = TreePanel(self.paned_window, padding=5)
+        self.tree_panel = TreePanel(self.paned_window, self.catalog, padding=5)
 
         # Create the detail view frame
-        self.detail_view = DetailView(self.paned_window, padding=5)
+        self.detail_view = DetailView(self.paned_window, self.notes, padding=5)
         self.detail_view.pack(fill=tk.BOTH, expand=True)
         self.paned_window.add(self.detail_view)
 
@@ -57,7 +63,6 @@ class ExplorerApp:
         self.file_menu.add_separator()
         self.file_menu.add_command(label="Import Account Codes", command=self.import_account_codes)
         self.file_menu.add_command(label="Export Account Codes", command=self.export_account_codes)
-        self.file_menu.entryconfig("Export Account Codes", state="disabled")
         self.file_menu.add_separator()
         self.file_menu.add_command(label="Import Personal Notes", command=self.import_notes)
         self.file_menu.add_command(label="Export Personal Notes", command=self.export_notes)
@@ -109,10 +114,9 @@ class ExplorerApp:
         self.status_label = ttk.Label(self.status_bar, text="Ready", font=("Consolas", 8))
         self.status_label.pack(side=tk.LEFT, padx=5, pady=2)
 
-        # placeholders for the progress popup
+        # placeholders for background tasks and their progress popup
         self.progress_popup = None
-        self.progress_label = None
-        self.progress_bar = None
+        self.worker = None
 
         # Load Config file
         self.app_config = configparser.ConfigParser()
@@ -160,10 +164,19 @@ class ExplorerApp:
         if "database" not in self.app_config:
             print("No database section found in config file. Creating empty section.")
             self.app_config["database"] = {}
+        if "import" not in self.app_config:
+            print("No import section found in config file. Creating empty section.")
+            self.app_config["import"] = {}
 
         # Validate color hierarchy
         self.color_hierarchy.set(self.app_config["panel"].get("color_hierarchy", "") == "True")
 
+        # Validate search as you type
+        self.search_view.live_search_var.set(self.app_config["panel"].get("live_search", "True") == "True")
+
+        # Validate lazy tree loading
+        self.tree_panel.lazy = self.app_config["panel"].get("lazy_tree", "True") == "True"
+
         # Validate left panel mode
         left_panel_mode = self.app_config["panel"].get("left_panel_mode", "")
         try:
@@ -245,6 +258,8 @@ class ExplorerApp:
         config["panel"] = {
             "color_hierarchy": "False",
             "left_panel_mode": "1",
+            "lazy_tree": "True",
+            "live_search": "True",
             "sort_mode": "Account Code",
         }
         config["window"] = {
@@ -253,6 +268,10 @@ class ExplorerApp:
         }
         config["database"] = {
             "path": "account_code_viewer.sqlite",
+            "snapshot": "False",
+        }
+        config["import"] = {
+            "batch_size": str(DEFAULT_BATCH_SIZE),
         }
         with open("config.ini", "w") as configfile:
             config.write(configfile)
@@ -262,14 +281,28 @@ class ExplorerApp:
         self.status_label.config(text=message)
 
     def database_init(self):
-        if not db.is_closed():
-            db.commit()
-            db.close()
-        db_path = self.app_config["database"]["path"]
-        db.init(db_path, pragmas={"journal_mode": "wal"})
-        db.connect()
-        db.create_tables([AccountCode, AccountCodeIndex], safe=True)
-        self.update_status(f"Connected to database: {Path(db_path).absolute()}")
+        # Optionally serve the read only catalog data from memory, reloaded whenever the catalog is imported
+        self.catalog.use_snapshot = self.app_config["database"].get("snapshot", "False") == "True"
+        result = self.catalog.open(self.app_config["database"]["path"], progress=self.on_migration_progress)
+        if result.migrated:
+            print("Database schema upgraded")
+        if result.reindexed:
+            print("Search index was out of date, index rebuilt")
+        self.update_status(f"Connected to database: {result.path}")
+
+    def on_migration_progress(self, number, total, description):
+        self.update_status(f"Upgrading database ({number}/{total}): {description}...")
+        self.root.update_idletasks()
+
+    def database_switch(self, db_path):
+        # Notes being edited belong to the database that is open now
+        self.detail_view.save_personal_notes(None)
+        self.app_config["database"]["path"] = db_path
+        self.database_init()
+        # The displayed records are from the previous database
+        self.search_view.clear_results()
+        self.detail_view.clear()
+        self.tree_panel.populate_tree()
 
     def database_open(self):
         db_path = filedialog.askopenfilename(
@@ -278,9 +311,7 @@ class ExplorerApp:
             filetypes=(("SQLite Files", "*.sqlite"),),
         )
         if db_path:
-            self.app_config["database"]["path"] = db_path
-            self.database_init()
-            self.tree_panel.populate_tree()
+            self.database_switch(db_path)
 
     def database_create(self):
         db_path = filedialog.asksaveasfilename(
@@ -290,9 +321,7 @@ class ExplorerApp:
             defaultextension=".sqlite",
         )
         if db_path:
-            self.app_config["database"]["path"] = db_path
-            self.database_init()
-            self.tree_panel.populate_tree()
+            self.database_switch(db_path)
 
     #########################################################################
     # event handlers
@@ -314,6 +343,8 @@ class ExplorerApp:
 
         self.app_config.set("panel", "color_hierarchy", str(self.color_hierarchy.get()))
         self.app_config.set("panel", "left_panel_mode", str(self.left_panel_mode.get()))
+        self.app_config.set("panel", "lazy_tree", str(self.tree_panel.lazy))
+        self.app_config.set("panel", "live_search", str(self.search_view.live_search_var.get()))
         self.app_config.set("panel", "sort_mode", str(self.search_view.sort_mode_combo.current()))
         x = self.root.winfo_x()
         y = self.root.winfo_y()
@@ -321,10 +352,9 @@ class ExplorerApp:
         height = self.root.winfo_height() + 20  # Add 20 for the status bar TODO: Find a better way to do this
         self.app_config.set("window", "size", f"{width}x{height}")
         self.app_config.set("window", "position", f"+{x}+{y}")
-        if db.database:
-            self.app_config.set("database", "path", db.database)
-            db.commit()
-            db.close()
+        if self.catalog.path:
+            self.app_config.set("database", "path", str(self.catalog.path))
+            self.catalog.close()
         self.app_config.write(open(self.app_config_path, "w"))
         self.root.destroy()
 
@@ -354,21 +384,28 @@ class ExplorerApp:
             if not self.tree_panel.tree.selection():
                 return
             selection = self.tree_panel.tree.selection()
-            acct_code = AccountCode.get(AccountCode.account_code == selection[0])
+            acct_code = self.get_account_code(selection[0], self.tree_panel.records)
             if selection:
                 self.detail_view.update_details(acct_code)
         elif mode == LeftPanelMode.SEARCH:
             if not self.search_view.results_list.selection():
                 return
             selection = self.search_view.results_list.selection()
-            acct_code = AccountCode.get(AccountCode.account_code == selection[0])
+            acct_code = self.get_account_code(selection[0], self.search_view.records)
             if selection:
                 self.detail_view.update_details(acct_code)
 
-    @staticmethod
-    def on_update_index():
-        AccountCodeIndex.rebuild()
-        AccountCodeIndex.optimize()
+    def get_account_code(self, account_code, records=None):
+        """AccountCodeRecord from the records a panel already holds, or from the catalog's snapshot or database"""
+        if records and account_code in records:
+            return records[account_code]
+        return self.catalog.get(account_code)
+
+    def on_update_index(self):
+        if self.catalog.ensure_index():
+            self.update_status("Search index rebuilt")
+        else:
+            self.update_status("Search index is already up to date")
 
     def select_search(self, event=None):
         self.tree_panel.search_combobox.focus_set()
@@ -378,31 +415,11 @@ class ExplorerApp:
     # Import Processes
     #########################################################################
 
-    def show_progress_popup(self):
-        self.progress_popup = tk.Toplevel(self.root)
-        self.progress_popup.title("Import Progress")
-
-        parent_x = self.root.winfo_x()
-        parent_y = self.root.winfo_y()
-        parent_width = self.root.winfo_width()
-        parent_height = self.root.winfo_height()
-
-        popup_width = 300
-        popup_height = 100
-
-        x = parent_x + (parent_width // 2) - (popup_width // 2)
-        y = parent_y + (parent_height // 2) - (popup_height // 2)
-
-        self.progress_popup.geometry(f"{popup_width}x{popup_height}+{x}+{y}")
-
-        self.progress_popup.geometry("300x100")
-        self.progress_label = ttk.Label(self.progress_popup, text="Importing account codes...")
-        self.progress_label.pack(pady=10)
-        self.progress_bar = ttk.Progressbar(self.progress_popup, mode="determinate")
-        self.progress_bar.pack(fill=tk.X, padx=20, pady=10)
-        self.progress_bar["value"] = 0
-
     def import_account_codes(self):
+        if self.worker is not None:
+            messagebox.showinfo("Import Account Codes", "An import is already in progress.")
+            return
+
         account_codes_csv = filedialog.askopenfilename(
             initialdir=self.app_config_path.parent,
             title="Select Account Codes CSV",
@@ -413,107 +430,150 @@ class ExplorerApp:
             print("No file selected")
             return
 
-        self.show_progress_popup()
-
-        def import_process():
-            # recreate the account code table
-            AccountCode().drop_table()
-            AccountCode().create_table()
-
-            with open(account_codes_csv, mode="r") as f:
-                csvreader = DictReader(f, dialect=excel)
-                total_rows = sum(1 for _ in csvreader)
-                f.seek(0)
-                next(csvreader)  # Skip header row, only needed because we did a seek(0) above
-
-                for i, row in enumerate(csvreader):
-                    code = AccountCode()
-                    acct_code = row["Account Code"].split(".")
-                    if len(acct_code) > 1 and len(acct_code[1]) == 1:
-                        acct_code[1] = acct_code[1] + "0"
-                    code.account_code = ".".join(acct_code)
-                    code.level = 1 + row["Account Code"].count(".")
-                    code.description = row["Description"]
-                    code.uom = row["Primary UOM"]
-                    code.uom2 = row["2nd UOM"]
-                    code.metric_uom = row["Metric Primary"]
-                    code.metric_uom2 = row["Metric 2nd"]
-                    code.notes = row["Notes"]
-                    code.has_labor_cost = row["Labor"] == "Yes"
-                    code.has_const_eqp_cost = row["Const. EQP"] == "Yes"
-                    code.has_fom_rented_eqp_cost = row["FOM Rented EQP"] == "Yes"
-                    code.has_supplies_cost = row["Supplies"] == "Yes"
-                    code.has_materials_cost = row["Materials"] == "Yes"
-                    code.has_subcontract_cost = row["Subcontract"] == "Yes"
-                    code.has_fixed_fees_and_services_cost = row["Fixed Fees and Services"] == "Yes"
-                    code.has_contingency_allowances_cost = row["Contingency (Allowances)"] == "Yes"
-                    code.has_ga_cost = row["G & A"] == "Yes"
-                    code.uom_to_sup_uom = row["Primary to Sup Primary"] == "TRUE"
-                    code.uom_to_sup_uom2 = row["Primary to Sup 2nd"] == "TRUE"
-                    code.uom2_to_sup_uom2 = row["2nd to Sup 2nd"] == "TRUE"
-                    code.auto_quantity_uom = row["Auto Quantity Primary"] == "TRUE"
-                    code.auto_quantity_uom2 = row["Auto Quantity 2nd"] == "TRUE"
-                    code.save()
-
-                    self.progress_label["text"] = f"Importing account codes... {i + 1}/{total_rows}"
-                    self.progress_bar["value"] = (i + 1) / total_rows * 100
-                    self.progress_popup.update_idletasks()
-
-            self.progress_popup.destroy()
-            self.tree_panel.populate_tree()
+        try:
+            batch_size = int(self.app_config["import"].get("batch_size", DEFAULT_BATCH_SIZE))
+        except ValueError:
+            print("Invalid import batch size. Using default batch size.")
+            batch_size = DEFAULT_BATCH_SIZE
+
+        # Merging keeps personal notes and only touches changed codes, an empty catalog is always imported in full
+        merge = False
+        if not self.catalog.is_empty():
+            merge = messagebox.askyesnocancel(
+                "Import Account Codes",
+                "Merge the changes into the existing account codes, keeping personal notes? Codes missing from the "
+                "file are removed together with their notes.\n\n"
+                "Choose No to replace every account code, this discards all personal notes.",
+            )
+            if merge is None:
+                return
 
-        threading.Thread(target=import_process).start()
+        # Write the notes being edited before the import replaces the codes under them
+        self.detail_view.save_personal_notes(None)
+        self.worker = ImportWorker(self.catalog, account_codes_csv, batch_size, merge=merge)
+        self.progress_popup = ProgressPopup(
+            self.root, "Import Progress", "Importing account codes...", on_cancel=self.worker.cancel
+        )
+        self.worker.start()
+        self.worker.poll(self.root, self.on_import_event)
+
+    def on_import_event(self, kind, *args):
+        if kind == "progress":
+            rows, bytes_read, total_bytes = args
+            percent = bytes_read / total_bytes * 100 if total_bytes else 100
+            self.progress_popup.update_progress(f"Importing account codes... {rows}", percent)
+            return
+
+        self.progress_popup.destroy()
+        self.progress_popup = None
+        self.worker = None
+        if kind == "done":
+            result = args[0]
+            if result.merged:
+                self.update_status(
+                    f"Merged {result.rows} account codes in {result.elapsed:.1f}s: {result.inserted} added, "
+                    f"{result.updated} changed, {result.deleted} removed"
+                )
+                if result.deleted_notes:
+                    messagebox.showwarning(
+                        "Import Account Codes",
+                        f"{result.deleted_notes} removed account codes had personal notes, those notes were deleted.",
+                    )
+            else:
+                self.update_status(
+                    f"Imported {result.rows} account codes in {result.elapsed:.1f}s "
+                    f"({result.rows_per_second:.0f} rows/s)"
+                )
+            if result.duplicates:
+                messagebox.showwarning(
+                    "Import Account Codes",
+                    f"{result.duplicates} rows repeated an account code, the last row of each code was kept.",
+                )
+            # The displayed records and their ids are from the catalog before the import
+            self.search_view.clear_results()
+            self.detail_view.clear()
+            self.tree_panel.populate_tree()
+        elif kind == "cancelled":
+            self.update_status("Import cancelled, no changes were made")
+        elif kind == "error":
+            messagebox.showerror("Import Account Codes", f"Import failed, no changes were made\n{args[0]}")
 
     def export_account_codes(self):
-        pass
+        if self.worker is not None:
+            messagebox.showinfo("Export Account Codes", "An import or export is already in progress.")
+            return
+
+        if self.catalog.is_empty():
+            messagebox.showinfo("Export Account Codes", "No account codes to export.")
+            return
+
+        file_path = filedialog.asksaveasfilename(
+            initialdir=self.app_config_path.parent,
+            title="Export Account Codes",
+            defaultextension=".csv",
+            filetypes=(
+                ("CSV Files", "*.csv"),
+                ("JSON Lines Files", "*.jsonl"),
+                ("Compressed CSV Files", "*.csv.gz"),
+                ("Compressed JSON Lines Files", "*.jsonl.gz"),
+            ),
+        )
+
+        if not file_path:
+            return
+
+        self.worker = ExportWorker(self.catalog, file_path)
+        self.progress_popup = ProgressPopup(
+            self.root, "Export Progress", "Exporting account codes...", on_cancel=self.worker.cancel
+        )
+        self.worker.start()
+        self.worker.poll(self.root, self.on_export_event)
+
+    def on_export_event(self, kind, *args):
+        if kind == "progress":
+            rows, total = args
+            percent = rows / total * 100 if total else 100
+            self.progress_popup.update_progress(f"Exporting account codes... {rows}", percent)
+            return
+
+        self.progress_popup.destroy()
+        self.progress_popup = None
+        self.worker = None
+        if kind == "done":
+            result = args[0]
+            self.update_status(
+                f"Exported {result.rows} account codes in {result.elapsed:.1f}s ({result.rows_per_second:.0f} rows/s)"
+            )
+        elif kind == "cancelled":
+            self.update_status("Export cancelled, no file was written")
+        elif kind == "error":
+            messagebox.showerror("Export Account Codes", f"Export failed\n{args[0]}")
 
     def export_notes(self):
-        # TODO: Add option to exclude notes not written by the current user
         export_config = ExportPopup(self.root)
         self.root.wait_window(export_config)
 
         if not export_config.result:
             return
 
-        notes = {
-            "author": export_config.result.get("author", None),
-            "date": export_config.result.get("date", None),
-            "file": Path(export_config.result.get("file", None)),
-            "notes": dict(),
-        }
-
-        for code in AccountCode.select():
-            if code.personal_notes:
-                notes["notes"][code.account_code] = code.personal_notes
-
-        if not notes["notes"]:
+        # Include the notes being edited, they are only saved when the selection changes
+        self.detail_view.save_personal_notes(None)
+        if not self.notes.has_notes():
             messagebox.showinfo("Export Notes", "No notes to export.")
             return
 
-        if notes["file"].suffix == ".csv":
-            with open(notes["file"], "w", newline="") as f:
-                writer = DictWriter(f, fieldnames=["Account Code", "Personal Notes", "Author", "Date"])
-                writer.writeheader()
-                for acct_code, note in notes["notes"].items():
-                    writer.writerow(
-                        {
-                            "Account Code": acct_code,
-                            "Personal Notes": note,
-                            "Author": notes["author"],
-                            "Date": notes["date"],
-                        }
-                    )
-
-        elif notes["file"].suffix == ".json":
-            with open(notes["file"], "w") as f:
-                del notes["file"]
-                json.dump(notes, f, indent=4)
-
-        else:
-            messagebox.showerror(
-                "Export Notes", f"Invalid file type returned [{notes["file"].suffix}]\nExport canceled"
+        try:
+            result = self.notes.export_notes(
+                export_config.result["file"],
+                author=export_config.result.get("author", None),
+                export_date=export_config.result.get("date", None),
+                only_author=export_config.result.get("only_author", False),
+                since=export_config.result.get("since", None),
             )
+        except ValueError as e:
+            messagebox.showerror("Export Notes", f"{e}\nExport canceled")
             return
+        self.update_status(f"Exported {result.notes} notes in {result.elapsed:.2f}s")
 
     def import_notes(self):
         import_config = ImportPopup(self.root)
@@ -529,39 +589,25 @@ class ExplorerApp:
         if not file_path:
             return
 
-        if file_path.endswith(".csv"):
-            with open(file_path, "r") as f:
-                reader = DictReader(f)
-                for row in reader:
-                    if annotate:
-                        notes = f"{row['Author'] or 'Unknown'} {row['Date'] or 'Unknown'}: {row['Personal Notes']}"
-                    else:
-                        notes = row["Personal Notes"]
-                    acct_code = AccountCode.get(AccountCode.account_code == row["Account Code"])
-
-                    if overwrite:
-                        acct_code.personal_notes = notes
-                    else:
-                        acct_code.personal_notes = f"{acct_code.personal_notes}\n{notes}"
-
-                    acct_code.save()
-
-        elif file_path.endswith(".json"):
-            with open(file_path, "r") as f:
-                notes = json.load(f)
-                for acct_code, note in notes["notes"].items():
-                    acct_code = AccountCode.get(AccountCode.account_code == acct_code)
-                    if annotate:
-                        note = f"{notes['author'] or 'Unknown'} {notes['date'] or 'Unknown'}: {note}"
-
-                    if overwrite:
-                        acct_code.personal_notes = note
-                    else:
-                        acct_code.personal_notes = f"{acct_code.personal_notes}\n{note}"
-                    acct_code.save()
-
-        # TODO: Add method to prevent duplicate notes
-        pass
+        # Save the notes being edited first, otherwise they would be written over the imported notes afterwards
+        self.detail_view.save_personal_notes(None)
+        try:
+            result = self.notes.import_notes(file_path, overwrite=overwrite, annotate=annotate)
+        except (ValueError, KeyError, json.JSONDecodeError) as e:
+            messagebox.showerror("Import Notes", f"Import failed, no notes were changed\n{e}")
+            return
+
+        self.update_status(
+            f"Imported {result.notes} notes into {result.updated} account codes in {result.elapsed:.2f}s, "
+            f"{result.skipped} duplicate or unmatched notes skipped"
+        )
+        if result.unmatched:
+            shown = ", ".join(result.unmatched[:10]) + (", ..." if len(result.unmatched) > 10 else "")
+            messagebox.showwarning(
+                "Import Notes", f"{len(result.unmatched)} account codes in the file were not found:\n{shown}"
+            )
+        # Show the imported notes for the code on display
+        self.on_tree_selection()
 
     def show_about(self):
         about = AboutPopup(self.root)
@@ -4,5 +4,101 @@ db = peewee.SqliteDatabase(None)
 
 # db must be initialized prior to importing models
 from .account_code import AccountCode, AccountCodeIndex  # noqa: E402
+from .metadata import Metadata  # noqa: E402
+from .index import data_generation, ensure_index, index_is_current, rebuild_index  # noqa: E402
+from .hierarchy import (  # noqa: E402
+    ancestors,
+    child_subtree_sizes,
+    children,
+    descendants,
+    subtree_condition,
+    subtree_flag_counts,
+)
+from .flags import FLAG_VALUES, FlagIndex, flag_condition, flag_index, flag_mask  # noqa: E402
+from .search import (  # noqa: E402
+    PAGE_SIZE,
+    SEARCH_FIELDS,
+    SearchCache,
+    page_cursor,
+    prefix_terms,
+    search_cache,
+    search_count,
+    search_page,
+    search_phrase,
+    search_query,
+)
+from .record import AccountCodeRecord  # noqa: E402
+from .snapshot import CatalogSnapshot  # noqa: E402
+from .typeahead import TypeAheadIndex  # noqa: E402
+from .migrations import MIGRATIONS, Migration, migrate, schema_version  # noqa: E402
+from .notes import (  # noqa: E402
+    NotesExportResult,
+    NotesImportResult,
+    export_notes,
+    filter_note,
+    import_notes,
+    iter_personal_notes,
+    read_notes,
+)
+from .importer import (  # noqa: E402
+    DEFAULT_BATCH_SIZE,
+    ImportResult,
+    OperationCancelled,
+    import_account_codes,
+    merge_account_codes,
+)
+from .exporter import EXPORT_FORMATS, ExportResult, export_account_codes  # noqa: E402
 
-__all__ = ["AccountCode", "AccountCodeIndex", db]
+__all__ = [
+    "AccountCode",
+    "AccountCodeIndex",
+    "Metadata",
+    db,
+    "DEFAULT_BATCH_SIZE",
+    "ImportResult",
+    "OperationCancelled",
+    "import_account_codes",
+    "merge_account_codes",
+    "EXPORT_FORMATS",
+    "ExportResult",
+    "export_account_codes",
+    "NotesImportResult",
+    "NotesExportResult",
+    "export_notes",
+    "filter_note",
+    "iter_personal_notes",
+    "import_notes",
+    "read_notes",
+    "data_generation",
+    "ensure_index",
+    "index_is_current",
+    "rebuild_index",
+    "MIGRATIONS",
+    "Migration",
+    "migrate",
+    "schema_version",
+    "TypeAheadIndex",
+    "SEARCH_FIELDS",
+    "search_phrase",
+    "search_query",
+    "search_count",
+    "page_cursor",
+    "PAGE_SIZE",
+    "prefix_terms",
+    "SearchCache",
+    "search_cache",
+    "search_page",
+    "CatalogSnapshot",
+    "FLAG_VALUES",
+    "FlagIndex",
+    "flag_condition",
+    "flag_index",
+    "flag_mask",
+    "AccountCodeRecord",
+    "ancestors",
+    "child_subtree_sizes",
+    "children",
+    "descendants",
+    "subtree_condition",
+    "subtree_flag_counts",
+]
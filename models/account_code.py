@@ -2,11 +2,17 @@ import peewee
 from playhouse.sqlite_ext import FTS5Model, SearchField, RowIDField
 
 
+from constants import AccountCodeFlags
 from . import db
 
+# Cost category flags, each has a partial index so filtering on one is an index search rather than a table scan
+COST_FLAGS = [flag for flag in AccountCodeFlags if flag.endswith("_cost")]
+
 
 class AccountCode(peewee.Model):
-    account_code = peewee.TextField()
+    account_code = peewee.TextField(unique=True)
+    parent_code = peewee.TextField(null=True)
+    sort_key = peewee.TextField(index=True)
     level = peewee.IntegerField()
     description = peewee.TextField()
     uom = peewee.TextField()
@@ -33,6 +39,17 @@ class AccountCode(peewee.Model):
 
     class Meta:
         database = db
+        indexes = ((("parent_code", "sort_key"), False),)
+
+
+# SQLite can't index (_flags & 32) != 0 through the packed column, but a partial index whose WHERE is exactly that
+# expression is used by any query filtering on the flag, including the BitField flag descriptors themselves
+for _flag in COST_FLAGS:
+    AccountCode.add_index(
+        AccountCode.index(AccountCode.level, AccountCode.sort_key, name=f"accountcode_{_flag}").where(
+            getattr(AccountCode, _flag)
+        )
+    )
 
 
 class AccountCodeIndex(FTS5Model):
@@ -44,4 +61,7 @@ class AccountCodeIndex(FTS5Model):
 
     class Meta:
         database = db
-        options = {"tokenize": "porter", "content": "AccountCode"}
+        # Prefix indexes answer prefix queries of exactly 2 or 3 characters (ex*, exc*), the first keystrokes of a live
+        # search whose term ranges are the widest. Longer prefixes such as excav* scan their narrower range of the main
+        # index
+        options = {"tokenize": "porter", "content": "AccountCode", "prefix": "2 3"}
@@ -0,0 +1,104 @@
+import gzip
+import json
+import os
+import time
+from csv import excel, writer
+from dataclasses import dataclass
+from pathlib import Path
+
+from . import db
+from .account_code import AccountCode
+from .importer import FLAG_COLUMNS, TEXT_COLUMNS, OperationCancelled
+
+DEFAULT_CHUNK_SIZE = 5000
+EXPORT_FORMATS = [".csv", ".jsonl", ".csv.gz", ".jsonl.gz"]
+
+# The account code CSV layout, the column order of the district's own export
+CSV_COLUMNS = ["Account Code", *TEXT_COLUMNS.values(), *(column for column, _ in FLAG_COLUMNS.values())]
+# Value written for an unset flag, the counterpart of the truthy value import_account_codes looks for
+FALSY_VALUES = {"Yes": "No", "TRUE": "FALSE"}
+
+EXPORT_FIELDS = ["account_code", "parent_code", "level", *TEXT_COLUMNS, "_flags"]
+
+
+@dataclass
+class ExportResult:
+    rows: int
+    elapsed: float
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def export_format(file_path):
+    """The entry of EXPORT_FORMATS file_path ends with, longest first so .csv.gz isn't taken for a plain .gz"""
+    name = Path(file_path).name.lower()
+    for suffix in sorted(EXPORT_FORMATS, key=len, reverse=True):
+        if name.endswith(suffix):
+            return suffix
+    raise ValueError(f"Unsupported export file type [{Path(file_path).suffix}]")
+
+
+def csv_rows(rows):
+    flags = [
+        (getattr(AccountCode, field)._value, truthy, FALSY_VALUES[truthy])
+        for field, (_, truthy) in FLAG_COLUMNS.items()
+    ]
+    for account_code, _, _, *text, packed in rows:
+        yield [account_code, *text, *(truthy if packed & value else falsy for value, truthy, falsy in flags)]
+
+
+def jsonl_lines(rows):
+    keys = [*EXPORT_FIELDS[:-1], *FLAG_COLUMNS]
+    values = [getattr(AccountCode, field)._value for field in FLAG_COLUMNS]
+    encode = json.JSONEncoder().encode
+    for *columns, packed in rows:
+        yield encode(dict(zip(keys, [*columns, *[packed & value != 0 for value in values]]))) + "\n"
+
+
+def export_account_codes(file_path, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, cancel=None):
+    """
+    Stream the catalog to file_path in account code order as CSV, JSON Lines or either one gzip compressed, chosen by
+    the file extension.
+
+    Rows are read chunk_size at a time from a tuples cursor and written as they arrive, so memory use doesn't grow
+    with the catalog. The CSV uses the layout import_account_codes reads, exporting and importing it again gives the
+    same catalog. Personal notes are not included, they have their own export. progress is called as
+    progress(rows_done, total_rows) after each chunk and cancel is an optional threading.Event. The file is written
+    under a temporary name and only replaces file_path once complete.
+    """
+    start = time.perf_counter()
+    file_path = Path(file_path)
+    file_format = export_format(file_path)
+    total = AccountCode.select().count()
+    query = AccountCode.select(*[getattr(AccountCode, field) for field in EXPORT_FIELDS]).order_by(AccountCode.sort_key)
+
+    partial = file_path.with_name(f"{file_path.name}.part")
+    opener = gzip.open if file_format.endswith(".gz") else open
+    rows = 0
+    try:
+        # Same default encoding the import opens the file with
+        with opener(partial, "wt", newline="") as f:
+            csv_writer = None
+            if file_format.startswith(".csv"):
+                csv_writer = writer(f, dialect=excel)
+                csv_writer.writerow(CSV_COLUMNS)
+
+            cursor = db.execute(query)
+            while chunk := cursor.fetchmany(chunk_size):
+                if cancel and cancel.is_set():
+                    raise OperationCancelled("Account code export cancelled")
+                if csv_writer:
+                    csv_writer.writerows(csv_rows(chunk))
+                else:
+                    f.writelines(jsonl_lines(chunk))
+                rows += len(chunk)
+                if progress:
+                    progress(rows, total)
+        os.replace(partial, file_path)
+    finally:
+        if partial.exists():
+            partial.unlink()
+
+    return ExportResult(rows=rows, elapsed=time.perf_counter() - start)
@@ -0,0 +1,126 @@
+import operator
+import sys
+import threading
+from array import array
+from functools import reduce
+from itertools import islice
+
+from bitarray import bitarray
+from bitarray.util import ones, zeros
+
+from constants import AccountCodeFlags, FlagMatch
+from . import db
+from .account_code import AccountCode
+from .index import catalog_generation
+
+# Bit value of each flag, in the order of AccountCodeFlags
+FLAG_VALUES = {flag: getattr(AccountCode, flag)._value for flag in AccountCodeFlags}
+FLAG_BITS = 16  # width of the array("H") the packed flags are read into
+
+
+def flag_mask(flags):
+    """Combine flag names into a _flags bit mask"""
+    mask = 0
+    for flag in flags:
+        mask |= FLAG_VALUES[flag]
+    return mask
+
+
+def flag_condition(mask, match=FlagMatch.ANY, field=AccountCode._flags):
+    """
+    SQL condition on a packed flags column with the same semantics as FlagIndex.matches. Each flag is tested on its
+    own, (_flags & 32) != 0 is the exact expression the cost flag partial indexes are built on.
+    """
+    terms = [field.bin_and(value) != 0 for value in FLAG_VALUES.values() if mask & value]
+    if match == FlagMatch.ANY:
+        return reduce(operator.or_, terms) if terms else field.bin_and(mask) != 0
+    elif match == FlagMatch.ALL:
+        return reduce(operator.and_, terms) if terms else field.bin_and(mask) == mask
+    elif match == FlagMatch.NONE:
+        return field.bin_and(mask) == 0
+    raise ValueError(f"Invalid FlagMatch {match}")
+
+
+class FlagIndex:
+    """
+    Bit sliced copy of the _flags column.
+
+    Each flag is held as its own bitarray with one bit per row, rows in sort_key order, so ANY, ALL and NONE filters
+    over any combination of flags are a few whole column AND/OR operations done in C. The result is a bitarray of row
+    positions that can be counted, paged or intersected with ids from a full text search.
+    """
+
+    def __init__(self, ids=(), flags=()):
+        self.ids = array("q", ids)
+        self.positions = None
+        packed = array("H", flags)
+        if sys.byteorder == "big":
+            packed.byteswap()
+        # Read little endian, bit k of row i lands at position i * FLAG_BITS + k, every FLAG_BITS-th bit is one flag
+        bits = bitarray(endian="little")
+        bits.frombytes(packed.tobytes())
+        self.columns = {value: bits[value.bit_length() - 1 :: FLAG_BITS] for value in FLAG_VALUES.values()}
+
+    @classmethod
+    def load(cls):
+        query = AccountCode.select(AccountCode.id, AccountCode._flags).order_by(AccountCode.sort_key)
+        rows = db.execute(query).fetchall()
+        return cls(*zip(*rows)) if rows else cls()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def matches(self, mask, match=FlagMatch.ANY):
+        """bitarray with a bit set for every row matching mask, an empty mask matches nothing for ANY and all for ALL"""
+        columns = [column for value, column in self.columns.items() if mask & value]
+        if match == FlagMatch.ALL:
+            result = ones(len(self), endian="little")
+            for column in columns:
+                result &= column
+            return result
+
+        result = zeros(len(self), endian="little")
+        for column in columns:
+            result |= column
+        if match == FlagMatch.NONE:
+            result.invert()
+        elif match != FlagMatch.ANY:
+            raise ValueError(f"Invalid FlagMatch {match}")
+        return result
+
+    def count(self, mask, match=FlagMatch.ANY):
+        return self.matches(mask, match).count()
+
+    def match_ids(self, mask, match=FlagMatch.ANY, after=None, limit=None):
+        """
+        Ids of matching rows in sort_key order. Rows are paged by position, pass the position returned for the last
+        page as after to continue, the returned position is None once every match was returned.
+        """
+        start = 0 if after is None else after + 1
+        positions = list(islice(self.matches(mask, match).search(1, start), limit))
+        last = positions[-1] if limit is not None and len(positions) == limit else None
+        return [self.ids[position] for position in positions], last
+
+    def filter_ids(self, ids, mask, match=FlagMatch.ANY):
+        """Keep the ids, for example full text search results, whose row matches, preserving their order"""
+        if self.positions is None:
+            self.positions = {row_id: position for position, row_id in enumerate(self.ids)}
+        matches = self.matches(mask, match)
+        return [row_id for row_id in ids if row_id in self.positions and matches[self.positions[row_id]]]
+
+
+_flag_index = None
+_flag_index_generation = None
+_flag_index_lock = threading.Lock()
+
+
+def flag_index():
+    """The FlagIndex for the current catalog generation, reloaded after an import but not after a notes edit"""
+    global _flag_index, _flag_index_generation
+    # The catalog generation is a small counter, another database opened in the same session may have the same one
+    generation = (db.database, catalog_generation())
+    with _flag_index_lock:
+        if _flag_index is None or _flag_index_generation != generation:
+            _flag_index = FlagIndex.load()
+            _flag_index_generation = generation
+        return _flag_index
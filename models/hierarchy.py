@@ -0,0 +1,84 @@
+from peewee import JOIN, fn
+
+from constants import AccountCodeFlags
+from .account_code import AccountCode
+
+SORT_KEY_WIDTH = 4
+
+
+def parent_code_of(account_code):
+    """Return the account code one level up, or None for a top level code"""
+    parent, _, _ = account_code.rpartition(".")
+    return parent or None
+
+
+def make_sort_key(account_code):
+    """
+    Zero pad each segment so that codes sort in hierarchy order as plain strings, e.g. 03.2 sorts before 03.10.
+    Every descendant of a code shares its sort key followed by a "." which makes subtrees range scannable.
+    """
+    return ".".join(segment.rjust(SORT_KEY_WIDTH, "0") for segment in account_code.split("."))
+
+
+def ancestor_codes(account_code):
+    """Return the codes above account_code, top level first"""
+    parts = account_code.split(".")
+    return [".".join(parts[:i]) for i in range(1, len(parts))]
+
+
+def subtree_condition(account_code, include_self=False, model=AccountCode):
+    """Condition matching every descendant of account_code, a single range scan on the sort_key index"""
+    sort_key = make_sort_key(account_code)
+    condition = (model.sort_key > f"{sort_key}.") & (model.sort_key < f"{sort_key}/")  # "/" sorts right after "."
+    if include_self:
+        condition |= model.sort_key == sort_key
+    return condition
+
+
+def children(account_code=None):
+    """Direct children of account_code, or the top level codes when account_code is None"""
+    if account_code is None:
+        condition = AccountCode.parent_code.is_null()
+    else:
+        condition = AccountCode.parent_code == account_code
+    return AccountCode.select().where(condition).order_by(AccountCode.sort_key)
+
+
+def descendants(account_code, include_self=False):
+    return AccountCode.select().where(subtree_condition(account_code, include_self)).order_by(AccountCode.sort_key)
+
+
+def ancestors(account_code):
+    return (
+        AccountCode.select()
+        .where(AccountCode.account_code.in_(ancestor_codes(account_code)))
+        .order_by(AccountCode.sort_key)
+    )
+
+
+def subtree_flag_counts(account_code, include_self=False):
+    """
+    Count the descendants of account_code and how many of them carry each flag in AccountCodeFlags, returned as a
+    dict with a "total" key plus one key per flag
+    """
+    columns = [fn.COUNT(AccountCode.id).alias("total")]
+    for flag in AccountCodeFlags:
+        columns.append(fn.TOTAL(getattr(AccountCode, flag)).alias(flag))
+    counts = AccountCode.select(*columns).where(subtree_condition(account_code, include_self)).dicts().get()
+    return {key: int(value) for key, value in counts.items()}
+
+
+def child_subtree_sizes(account_code=None):
+    """Map each child of account_code to the number of codes below it, in one query"""
+    Descendant = AccountCode.alias()
+    on = (Descendant.sort_key > AccountCode.sort_key.concat(".")) & (
+        Descendant.sort_key < AccountCode.sort_key.concat("/")
+    )
+    query = (
+        children(account_code)
+        .select(AccountCode.account_code, fn.COUNT(Descendant.id))
+        .join(Descendant, JOIN.LEFT_OUTER, on=on)
+        .group_by(AccountCode.id)
+        .tuples()
+    )
+    return dict(query)
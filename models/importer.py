@@ -0,0 +1,228 @@
+import os
+import time
+from csv import DictReader, excel
+from dataclasses import dataclass
+
+from . import db
+from .account_code import AccountCode
+from .hierarchy import make_sort_key, parent_code_of
+from .index import (
+    bump_catalog_generation,
+    bump_data_generation,
+    index_is_current,
+    init_generations,
+    install_index_triggers,
+    mark_index_current,
+    rebuild_index,
+)
+
+DEFAULT_BATCH_SIZE = 500
+
+# Maps flag fields on AccountCode to the CSV column and the value that marks the flag as set
+FLAG_COLUMNS = {
+    "has_labor_cost": ("Labor", "Yes"),
+    "has_const_eqp_cost": ("Const. EQP", "Yes"),
+    "has_fom_rented_eqp_cost": ("FOM Rented EQP", "Yes"),
+    "has_supplies_cost": ("Supplies", "Yes"),
+    "has_materials_cost": ("Materials", "Yes"),
+    "has_subcontract_cost": ("Subcontract", "Yes"),
+    "has_fixed_fees_and_services_cost": ("Fixed Fees and Services", "Yes"),
+    "has_contingency_allowances_cost": ("Contingency (Allowances)", "Yes"),
+    "has_ga_cost": ("G & A", "Yes"),
+    "uom_to_sup_uom": ("Primary to Sup Primary", "TRUE"),
+    "uom_to_sup_uom2": ("Primary to Sup 2nd", "TRUE"),
+    "uom2_to_sup_uom2": ("2nd to Sup 2nd", "TRUE"),
+    "auto_quantity_uom": ("Auto Quantity Primary", "TRUE"),
+    "auto_quantity_uom2": ("Auto Quantity 2nd", "TRUE"),
+}
+
+# Maps text fields on AccountCode to their CSV column
+TEXT_COLUMNS = {
+    "description": "Description",
+    "uom": "Primary UOM",
+    "uom2": "2nd UOM",
+    "metric_uom": "Metric Primary",
+    "metric_uom2": "Metric 2nd",
+    "notes": "Notes",
+}
+
+# Columns of AccountCode filled from the CSV, personal notes are the user's own and never imported
+CATALOG_FIELDS = ["account_code", "parent_code", "sort_key", "level", *TEXT_COLUMNS, "_flags"]
+STAGING_TABLE = "accountcode_staging"
+
+
+class OperationCancelled(Exception):
+    """Raised inside a transaction when a long running operation is cancelled, rolling back any partial changes"""
+
+
+@dataclass
+class ImportResult:
+    rows: int
+    elapsed: float
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    deleted_notes: int = 0  # personal notes lost with deleted codes
+    duplicates: int = 0  # rows repeating an account code seen earlier in the file, the last of them is kept
+    merged: bool = False
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def normalize_account_code(account_code):
+    acct_code = account_code.split(".")
+    if len(acct_code) > 1 and len(acct_code[1]) == 1:
+        acct_code[1] = acct_code[1] + "0"
+    return ".".join(acct_code)
+
+
+def row_to_account_code(row):
+    """Convert a row from the account code CSV into a dict suitable for AccountCode.insert_many"""
+    flags = 0
+    for field, (column, truthy) in FLAG_COLUMNS.items():
+        if row[column] == truthy:
+            flags |= getattr(AccountCode, field)._value
+
+    account_code = normalize_account_code(row["Account Code"])
+    values = {
+        "account_code": account_code,
+        "parent_code": parent_code_of(account_code),
+        "sort_key": make_sort_key(account_code),
+        "level": 1 + row["Account Code"].count("."),
+        "_flags": flags,
+    }
+    for field, column in TEXT_COLUMNS.items():
+        values[field] = row[column]
+    return values
+
+
+def iter_batches(rows, batch_size):
+    """Yield lists of at most batch_size converted rows, keeping only one batch in memory at a time"""
+    batch = []
+    for row in rows:
+        batch.append(row_to_account_code(row))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_account_codes(csv_path, batch_size=DEFAULT_BATCH_SIZE, progress=None, cancel=None):
+    """
+    Replace the AccountCode table with the contents of the account code CSV.
+
+    The file is streamed in a single pass and rows are written with insert_many in batches of batch_size inside a
+    single transaction, so a failure partway through leaves the existing table untouched. progress is called as
+    progress(rows_done, bytes_read, total_bytes) after each batch, using the file offset rather than a row count.
+    cancel is an optional threading.Event checked between batches, setting it rolls back the import.
+
+    District files have been seen to repeat an account code. Each code is stored once, the last row for it replaces
+    the earlier ones, and the number of repeated rows is reported as duplicates.
+    """
+    start = time.perf_counter()
+    total_bytes = os.path.getsize(csv_path)
+    with open(csv_path, mode="r", newline="") as f, db.atomic():
+        AccountCode.drop_table()
+        AccountCode.create_table()
+
+        rows = load_rows(
+            f,
+            lambda batch: AccountCode.insert_many(batch).on_conflict_replace().execute(),
+            batch_size,
+            progress,
+            cancel,
+            total_bytes,
+        )
+        inserted = AccountCode.select().count()
+
+        # Dropping the table removed the index triggers, index everything at once and then reinstall them
+        bump_data_generation()
+        bump_catalog_generation()
+        rebuild_index()
+        install_index_triggers()
+
+    return ImportResult(rows=rows, elapsed=time.perf_counter() - start, inserted=inserted, duplicates=rows - inserted)
+
+
+def load_rows(f, insert, batch_size, progress, cancel, total_bytes):
+    """Stream the CSV in f through insert(batch) one batch at a time, returns the number of rows loaded"""
+    rows = 0
+    for batch in iter_batches(DictReader(f, dialect=excel), batch_size):
+        if cancel and cancel.is_set():
+            raise OperationCancelled("Account code import cancelled")
+        insert(batch)
+        rows += len(batch)
+        if progress:
+            # The text layer reads ahead in fixed size chunks, so the buffer offset is accurate to within a chunk
+            progress(rows, f.buffer.tell(), total_bytes)
+    return rows
+
+
+def merge_account_codes(csv_path, batch_size=DEFAULT_BATCH_SIZE, progress=None, cancel=None):
+    """
+    Bring the AccountCode table in line with the account code CSV, changing only the codes that differ.
+
+    The CSV is streamed into a temporary staging table, then the codes missing from it are deleted, changed codes are
+    updated in place and new codes inserted, each with one set based statement. Personal notes are kept for every code
+    still in the catalog and the search index triggers update only the changed rows. progress and cancel behave as
+    for import_account_codes, so do repeated codes, and everything happens in a single transaction.
+    """
+    start = time.perf_counter()
+    total_bytes = os.path.getsize(csv_path)
+    table = AccountCode._meta.table_name
+    columns = ", ".join(CATALOG_FIELDS)
+    current = ", ".join(f"{table}.{field}" for field in CATALOG_FIELDS)
+    staged = ", ".join(f"s.{field}" for field in CATALOG_FIELDS)
+    with open(csv_path, mode="r", newline="") as f, db.atomic():
+        init_generations()
+        # The triggers only keep an index that is already current in sync, otherwise it is rebuilt afterwards
+        indexed = index_is_current()
+
+        db.execute_sql(f"CREATE TEMP TABLE {STAGING_TABLE} AS SELECT {columns} FROM {table} WHERE 0")
+        db.execute_sql(f"CREATE UNIQUE INDEX temp.{STAGING_TABLE}_account_code ON {STAGING_TABLE} (account_code)")
+        # Staging rows go straight to a prepared statement, generating insert_many SQL would cost more than the merge
+        insert = f"INSERT OR REPLACE INTO {STAGING_TABLE} ({columns}) VALUES ({', '.join('?' * len(CATALOG_FIELDS))})"
+
+        def stage(batch):
+            db.cursor().executemany(insert, [[row[field] for field in CATALOG_FIELDS] for row in batch])
+
+        rows = load_rows(f, stage, batch_size, progress, cancel, total_bytes)
+        if cancel and cancel.is_set():
+            raise OperationCancelled("Account code import cancelled")
+        duplicates = rows - db.execute_sql(f"SELECT count(*) FROM {STAGING_TABLE}").fetchone()[0]
+
+        removed = f"FROM {table} WHERE account_code NOT IN (SELECT account_code FROM {STAGING_TABLE})"
+        deleted_notes = db.execute_sql(f"SELECT count(personal_notes) {removed}").fetchone()[0]
+        deleted = db.execute_sql(f"DELETE {removed}").rowcount
+        updated = db.execute_sql(
+            f"UPDATE {table} SET ({columns}) = ({staged}) FROM {STAGING_TABLE} AS s "
+            f"WHERE {table}.account_code = s.account_code AND ({current}) IS NOT ({staged})"
+        ).rowcount
+        inserted = db.execute_sql(
+            f"INSERT INTO {table} ({columns}) SELECT {staged} FROM {STAGING_TABLE} AS s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {table}.account_code = s.account_code)"
+        ).rowcount
+        db.execute_sql(f"DROP TABLE temp.{STAGING_TABLE}")
+
+        if deleted or updated or inserted:
+            bump_data_generation()
+            bump_catalog_generation()
+        if indexed:
+            mark_index_current()
+        else:
+            install_index_triggers()
+            rebuild_index()
+
+    return ImportResult(
+        rows=rows,
+        elapsed=time.perf_counter() - start,
+        inserted=inserted,
+        updated=updated,
+        deleted=deleted,
+        deleted_notes=deleted_notes,
+        duplicates=duplicates,
+        merged=True,
+    )
@@ -0,0 +1,115 @@
+from . import db
+from .account_code import AccountCode, AccountCodeIndex
+from .metadata import Metadata
+
+INDEXED_FIELDS = ["account_code", "description", "notes", "personal_notes"]
+
+# Bumped whenever AccountCode changes, the index is current when both generations match
+DATA_GENERATION = "data_generation"
+INDEX_GENERATION = "index_generation"
+# Bumped only by account code imports, personal notes edits leave it alone. For data derived from the catalog columns
+CATALOG_GENERATION = "catalog_generation"
+
+
+def _index_triggers():
+    """
+    Triggers keeping the external content FTS table in sync with AccountCode.
+
+    Dropping the AccountCode table drops these triggers too, bulk imports rely on that to skip per row index updates
+    and rebuild the index once the data is loaded. Since the triggers change the data and the index together they
+    advance both generations.
+    """
+    table = AccountCode._meta.table_name
+    index = AccountCodeIndex._meta.table_name
+    metadata = Metadata._meta.table_name
+    columns = ", ".join(INDEXED_FIELDS)
+    new_values = ", ".join(f"new.{field}" for field in INDEXED_FIELDS)
+    old_values = ", ".join(f"old.{field}" for field in INDEXED_FIELDS)
+
+    insert = f"INSERT INTO {index}(rowid, {columns}) VALUES (new.id, {new_values});"
+    delete = f"INSERT INTO {index}({index}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    bump = f"UPDATE {metadata} SET value = value + 1 WHERE key IN ('{DATA_GENERATION}', '{INDEX_GENERATION}');"
+    return {
+        f"{table}_index_insert": f"AFTER INSERT ON {table} BEGIN {insert} {bump} END",
+        f"{table}_index_delete": f"AFTER DELETE ON {table} BEGIN {delete} {bump} END",
+        f"{table}_index_update": f"AFTER UPDATE OF {columns} ON {table} BEGIN {delete} {insert} {bump} END",
+    }
+
+
+def get_generation(key):
+    return Metadata.select(Metadata.value).where(Metadata.key == key).scalar() or 0
+
+
+def data_generation():
+    return get_generation(DATA_GENERATION)
+
+
+def index_generation():
+    return get_generation(INDEX_GENERATION)
+
+
+def catalog_generation():
+    return get_generation(CATALOG_GENERATION)
+
+
+def init_generations():
+    Metadata.insert_many(
+        [{"key": key, "value": 0} for key in (DATA_GENERATION, INDEX_GENERATION, CATALOG_GENERATION)]
+    ).on_conflict_ignore().execute()
+
+
+def bump_data_generation():
+    Metadata.update(value=Metadata.value + 1).where(Metadata.key == DATA_GENERATION).execute()
+
+
+def bump_catalog_generation():
+    Metadata.update(value=Metadata.value + 1).where(Metadata.key == CATALOG_GENERATION).execute()
+
+
+def index_triggers_installed():
+    names = list(_index_triggers())
+    placeholders = ", ".join("?" for _ in names)
+    cursor = db.execute_sql(
+        f"SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN ({placeholders})", names
+    )
+    return cursor.fetchone()[0] == len(names)
+
+
+def install_index_triggers():
+    for name, body in _index_triggers().items():
+        db.execute_sql(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+def index_is_current():
+    """
+    Cheap consistency check, the generations must match, the triggers must be installed and the index must hold a
+    document for every account code
+    """
+    if data_generation() != index_generation() or not index_triggers_installed():
+        return False
+    docsize = f"{AccountCodeIndex._meta.table_name}_docsize"
+    indexed = db.execute_sql(f"SELECT count(*) FROM {docsize}").fetchone()[0]
+    return indexed == AccountCode.select().count()
+
+
+def mark_index_current():
+    """Record that the index reflects the current data, for changes the index triggers already applied"""
+    Metadata.update(value=data_generation()).where(Metadata.key == INDEX_GENERATION).execute()
+
+
+def rebuild_index():
+    with db.atomic():
+        AccountCodeIndex.rebuild()
+        AccountCodeIndex.optimize()
+        mark_index_current()
+
+
+def ensure_index():
+    """Install missing triggers and rebuild the index only if it is stale, returns True if a rebuild was needed"""
+    with db.atomic():
+        init_generations()
+        if index_is_current():
+            return False
+        install_index_triggers()
+        rebuild_index()
+    return True
@@ -0,0 +1,11 @@
+import peewee
+
+from . import db
+
+
+class Metadata(peewee.Model):
+    key = peewee.TextField(primary_key=True)
+    value = peewee.IntegerField(default=0)
+
+    class Meta:
+        database = db
@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+from collections.abc import Callable
+from itertools import groupby
+
+from . import db
+from .account_code import COST_FLAGS, AccountCode, AccountCodeIndex
+from .hierarchy import make_sort_key, parent_code_of
+from .index import init_generations, install_index_triggers, mark_index_current
+from .metadata import Metadata
+
+MODELS = [AccountCode, AccountCodeIndex, Metadata]
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[], None]
+
+
+# Registered steps in version order, the database records the last one applied in PRAGMA user_version
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register the decorated function as the step upgrading the schema to version"""
+
+    def register(upgrade):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"Migration {version} registered out of order")
+        MIGRATIONS.append(Migration(version, description, upgrade))
+        return upgrade
+
+    return register
+
+
+def schema_version():
+    return db.pragma("user_version")
+
+
+def set_schema_version(version):
+    db.pragma("user_version", version)
+
+
+def migrate(progress=None):
+    """
+    Bring the database up to the latest schema version, calling progress(number, total, description) before each
+    pending step. Returns the versions applied.
+
+    Every step commits together with its new user_version, a failed or interrupted upgrade rolls back only the step in
+    progress and is resumed from there the next time. A new database is created at the latest version directly, with
+    the index triggers installed so its empty search index starts out current.
+    """
+    latest = MIGRATIONS[-1].version
+    if not db.table_exists(AccountCode._meta.table_name):
+        with db.atomic():
+            db.create_tables(MODELS)
+            init_generations()
+            install_index_triggers()
+            mark_index_current()
+            set_schema_version(latest)
+        return []
+
+    current = schema_version()
+    pending = [step for step in MIGRATIONS if step.version > current]
+    for number, step in enumerate(pending, 1):
+        if progress:
+            progress(number, len(pending), step.description)
+        with db.atomic():
+            step.upgrade()
+            set_schema_version(step.version)
+
+    # Tables introduced since the database was created start out empty, they need no migration of their own
+    db.create_tables(MODELS, safe=True)
+    return [step.version for step in pending]
+
+
+# Databases created before versioning report user_version 0 but may already have some of these changes, every step
+# checks the schema first so it is a no-op when there is nothing to do.
+
+
+@migration(1, "Add hierarchy columns")
+def add_hierarchy_columns():
+    table = AccountCode._meta.table_name
+    columns = {column.name for column in db.get_columns(table)}
+    if "parent_code" in columns and "sort_key" in columns:
+        return
+    if "parent_code" not in columns:
+        db.execute_sql(f"ALTER TABLE {table} ADD COLUMN parent_code TEXT")
+    if "sort_key" not in columns:
+        db.execute_sql(f"ALTER TABLE {table} ADD COLUMN sort_key TEXT NOT NULL DEFAULT ''")
+    # Compute the hierarchy columns in a single statement using the Python implementations
+    db.register_function(parent_code_of, "parent_code_of", 1)
+    db.register_function(make_sort_key, "make_sort_key", 1)
+    db.execute_sql(
+        f"UPDATE {table} SET parent_code = parent_code_of(account_code), sort_key = make_sort_key(account_code)"
+    )
+
+
+@migration(2, "Make account codes unique")
+def unique_account_codes():
+    table = AccountCode._meta.table_name
+    # Before codes were unique a code repeated in the imported CSV was stored more than once. Keep the first row of each
+    # code with the personal notes of all its rows, so the index can be created without losing anything the user wrote
+    duplicates = db.execute_sql(
+        f"SELECT id, account_code, personal_notes FROM {table} WHERE account_code IN "
+        f"(SELECT account_code FROM {table} GROUP BY account_code HAVING count(*) > 1) ORDER BY account_code, id"
+    )
+    for account_code, rows in groupby(duplicates.fetchall(), key=lambda row: row[1]):
+        rows = list(rows)
+        keep = rows[0][0]
+        notes = dict.fromkeys(notes for _, _, notes in rows if notes and not notes.isspace())
+        db.execute_sql(f"UPDATE {table} SET personal_notes = ? WHERE id = ?", ("\n".join(notes) or None, keep))
+        db.execute_sql(f"DELETE FROM {table} WHERE account_code = ? AND id != ?", (account_code, keep))
+    db.execute_sql(f'CREATE UNIQUE INDEX IF NOT EXISTS "{table}_account_code" ON "{table}" ("account_code")')
+
+
+@migration(3, "Add prefix indexes to the search index")
+def add_search_prefix_indexes():
+    # FTS5 options can't be altered, drop an index created without prefix indexes. ensure_index sees the empty index
+    # and rebuilds it once the database is open.
+    table = AccountCodeIndex._meta.table_name
+    if db.table_exists(table):
+        sql = db.execute_sql("SELECT sql FROM sqlite_master WHERE name = ?", (table,)).fetchone()[0]
+        if "prefix=" in sql:
+            return
+        AccountCodeIndex.drop_table()
+    AccountCodeIndex.create_table()
+
+
+@migration(4, "Index the cost flags")
+def index_cost_flags():
+    table = AccountCode._meta.table_name
+    existing = {index.name for index in db.get_indexes(table)}
+    if all(f"accountcode_{flag}" in existing for flag in COST_FLAGS):
+        return
+    AccountCode._schema.create_indexes(safe=True)
+    # Give the planner row counts for the new indexes so it prefers them for selective flags
+    db.execute_sql(f"ANALYZE {table}")
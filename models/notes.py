@@ -0,0 +1,228 @@
+import json
+import re
+import time
+from csv import DictReader, DictWriter
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from . import db
+from .account_code import AccountCode
+
+NOTES_STAGING_TABLE = "notes_staging"
+NOTES_NEW_TABLE = "notes_new"
+NOTES_CSV_COLUMNS = ["Account Code", "Personal Notes", "Author", "Date"]
+DEFAULT_CHUNK_SIZE = 1000
+
+# "Author Date: note", the prefix annotate_note gives imported notes, the author may contain spaces but the date can't.
+# Only a line whose date parses, or is the Unknown annotate_note writes, is an annotation, "Rate per CY: 45" is not
+UNKNOWN_DATE = "Unknown"
+ANNOTATION = re.compile(r"^(?P<author>.+?) (?P<date>\S+): ")
+ANNOTATION_DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%y", "%m/%d/%Y"]
+
+
+@dataclass
+class NotesImportResult:
+    rows: int
+    notes: int  # notes written, after skipping duplicates and unknown codes
+    updated: int  # account codes whose personal notes changed
+    unmatched: list[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def skipped(self):
+        return self.rows - self.notes
+
+
+@dataclass
+class NotesExportResult:
+    notes: int
+    elapsed: float
+
+
+def annotate_note(note, author, date):
+    return f"{author or 'Unknown'} {date or UNKNOWN_DATE}: {note}"
+
+
+def read_notes(file_path, annotate=False):
+    """
+    Yield (account_code, note) from a notes CSV or JSON export, prefixing the author and date when annotating. Empty
+    notes are skipped, annotating them would make them look like content.
+    """
+    file_path = Path(file_path)
+    if file_path.suffix == ".csv":
+        with open(file_path, "r", newline="") as f:
+            for row in DictReader(f):
+                note = row["Personal Notes"]
+                if not note or note.isspace():
+                    continue
+                if annotate:
+                    note = annotate_note(note, row.get("Author"), row.get("Date"))
+                yield row["Account Code"], note
+    elif file_path.suffix == ".json":
+        with open(file_path, "r") as f:
+            notes = json.load(f)
+        for account_code, note in notes["notes"].items():
+            if not note or note.isspace():
+                continue
+            if annotate:
+                note = annotate_note(note, notes.get("author"), notes.get("date"))
+            yield account_code, note
+    else:
+        raise ValueError(f"Unsupported notes file type [{file_path.suffix}]")
+
+
+def import_notes(file_path, overwrite=False, annotate=False):
+    """
+    Apply a personal notes export to the matching account codes in one transaction.
+
+    Notes are staged in a temporary table, notes for unknown codes are reported rather than failing the import and
+    exact duplicates are skipped, within the file and, when amending, notes already present in the code's personal
+    notes. The remaining notes are applied with a single UPDATE ... FROM, appended to the existing notes or, with
+    overwrite, replacing them.
+    """
+    start = time.perf_counter()
+    table = AccountCode._meta.table_name
+    with db.atomic():
+        db.execute_sql(f"CREATE TEMP TABLE {NOTES_STAGING_TABLE} (account_code TEXT NOT NULL, note TEXT NOT NULL)")
+        cursor = db.cursor()
+        cursor.executemany(
+            f"INSERT INTO {NOTES_STAGING_TABLE} (account_code, note) VALUES (?, ?)",
+            read_notes(file_path, annotate),
+        )
+        rows = db.execute_sql(f"SELECT count(*) FROM {NOTES_STAGING_TABLE}").fetchone()[0]
+        unmatched = [
+            account_code
+            for (account_code,) in db.execute_sql(
+                f"SELECT DISTINCT account_code FROM {NOTES_STAGING_TABLE} "
+                f"WHERE account_code NOT IN (SELECT account_code FROM {table}) ORDER BY account_code"
+            )
+        ]
+
+        # Each distinct note once per code, in file order, leaving out notes the code already has when amending. Notes
+        # are compared as whole lines, "wall" is not already there because "drywall" is
+        fresh = (
+            "1"
+            if overwrite
+            else "instr(char(10) || coalesce(a.personal_notes, '') || char(10), char(10) || s.note || char(10)) = 0"
+        )
+        db.execute_sql(
+            f"CREATE TEMP TABLE {NOTES_NEW_TABLE} AS SELECT s.account_code, s.note FROM {NOTES_STAGING_TABLE} AS s "
+            f"JOIN {table} AS a ON a.account_code = s.account_code WHERE {fresh} "
+            f"GROUP BY s.account_code, s.note ORDER BY min(s.rowid)"
+        )
+        notes = db.execute_sql(f"SELECT count(*) FROM {NOTES_NEW_TABLE}").fetchone()[0]
+        # Grouping through the index visits each code's notes in rowid order, keeping them in file order when joined
+        db.execute_sql(f"CREATE INDEX temp.{NOTES_NEW_TABLE}_account_code ON {NOTES_NEW_TABLE} (account_code)")
+
+        if overwrite:
+            value = "m.note"
+            changed = f"{table}.personal_notes IS NOT m.note"
+        else:
+            value = f"coalesce(nullif({table}.personal_notes, '') || char(10), '') || m.note"
+            changed = "1"
+        updated = db.execute_sql(
+            f"UPDATE {table} SET personal_notes = {value} FROM "
+            f"(SELECT account_code, group_concat(note, char(10)) AS note FROM {NOTES_NEW_TABLE} "
+            f"GROUP BY account_code) AS m "
+            f"WHERE {table}.account_code = m.account_code AND {changed}"
+        ).rowcount
+
+        db.execute_sql(f"DROP TABLE temp.{NOTES_STAGING_TABLE}")
+        db.execute_sql(f"DROP TABLE temp.{NOTES_NEW_TABLE}")
+
+    return NotesImportResult(
+        rows=rows, notes=notes, updated=updated, unmatched=unmatched, elapsed=time.perf_counter() - start
+    )
+
+
+def parse_note_date(text):
+    for date_format in ANNOTATION_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    return None
+
+
+def filter_note(note, author=None, since=None):
+    """
+    Drop the annotated entries of note written by someone other than author, or dated before since. Lines without an
+    annotation are the user's own, or continue the entry above them, and are kept along with it.
+    """
+    kept = []
+    keep = True
+    for line in note.split("\n"):
+        match = ANNOTATION.match(line)
+        entry_date = parse_note_date(match["date"]) if match else None
+        if entry_date is not None or (match and match["date"] == UNKNOWN_DATE):
+            keep = (author is None or match["author"] == author) and (
+                since is None or entry_date is None or entry_date >= since
+            )
+        if keep:
+            kept.append(line)
+    return "\n".join(kept)
+
+
+def iter_personal_notes(author=None, since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield (account_code, personal_notes) in account code order, fetching chunk_size rows at a time. Only the two
+    columns of codes that have notes are read, author and since filter the annotated entries as in filter_note.
+    """
+    query = (
+        AccountCode.select(AccountCode.account_code, AccountCode.personal_notes)
+        .where(AccountCode.personal_notes.is_null(False) & (AccountCode.personal_notes != ""))
+        .order_by(AccountCode.sort_key)
+    )
+    cursor = db.execute(query)
+    while rows := cursor.fetchmany(chunk_size):
+        for account_code, note in rows:
+            if author is not None or since is not None:
+                note = filter_note(note, author, since)
+            if note.strip():
+                yield account_code, note
+
+
+def write_notes_csv(f, notes, author, export_date):
+    writer = DictWriter(f, fieldnames=NOTES_CSV_COLUMNS)
+    writer.writeheader()
+    count = 0
+    for account_code, note in notes:
+        writer.writerow({"Account Code": account_code, "Personal Notes": note, "Author": author, "Date": export_date})
+        count += 1
+    return count
+
+
+def write_notes_json(f, notes, author, export_date):
+    """Write the {"author", "date", "notes": {code: note}} document one note at a time instead of building it"""
+    f.write(f'{{\n    "author": {json.dumps(author)},\n    "date": {json.dumps(export_date)},\n    "notes": {{')
+    count = 0
+    separator = "\n"
+    for account_code, note in notes:
+        f.write(f"{separator}        {json.dumps(account_code)}: {json.dumps(note)}")
+        separator = ",\n"
+        count += 1
+    f.write("\n    }\n}\n" if count else "}\n}\n")
+    return count
+
+
+def export_notes(file_path, author=None, export_date=None, only_author=False, since=None):
+    """
+    Stream personal notes to a CSV or JSON file as they are read, returning how many were written.
+
+    author and export_date label the export, they are what import_notes uses to annotate the notes. With only_author
+    entries annotated by other authors are left out and since (a date) drops annotated entries older than it.
+    """
+    start = time.perf_counter()
+    file_path = Path(file_path)
+    if file_path.suffix == ".csv":
+        write, newline = write_notes_csv, ""
+    elif file_path.suffix == ".json":
+        write, newline = write_notes_json, None
+    else:
+        raise ValueError(f"Unsupported notes file type [{file_path.suffix}]")
+
+    notes = iter_personal_notes(author if only_author else None, since)
+    with open(file_path, "w", newline=newline) as f:
+        count = write(f, notes, author, export_date)
+    return NotesExportResult(notes=count, elapsed=time.perf_counter() - start)
@@ -0,0 +1,68 @@
+from typing import NamedTuple
+
+from constants import AccountCodeFlags
+from . import db
+from .account_code import AccountCode
+
+# Columns of AccountCode carried by a record, in field order, personal notes are edited so they stay in the database
+RECORD_FIELDS = [
+    "id",
+    "account_code",
+    "parent_code",
+    "level",
+    "description",
+    "uom",
+    "uom2",
+    "metric_uom",
+    "metric_uom2",
+    "notes",
+    "_flags",
+]
+
+
+class AccountCodeRecord(NamedTuple):
+    """
+    Immutable, lightweight copy of an AccountCode row for the UI.
+
+    A plain tuple subclass with no per instance __dict__, built straight from .tuples() queries without the peewee
+    Model machinery. The flag properties of AccountCode are available under the same names.
+    """
+
+    id: int
+    account_code: str
+    parent_code: str | None
+    level: int
+    description: str
+    uom: str
+    uom2: str
+    metric_uom: str
+    metric_uom2: str
+    notes: str
+    flags: int
+
+    @property
+    def label(self):
+        return f"{self.account_code} - {self.description}"
+
+    @staticmethod
+    def select():
+        """AccountCode query selecting the record columns, narrow it down and pass it to fetch or get"""
+        return AccountCode.select(*[getattr(AccountCode, field) for field in RECORD_FIELDS])
+
+    @classmethod
+    def fetch(cls, query):
+        # Every record column is stored in its Python type, the raw cursor skips peewee's per value conversion
+        return list(map(cls._make, db.execute(query)))
+
+    @classmethod
+    def get(cls, account_code):
+        row = cls.select().where(AccountCode.account_code == account_code).tuples().get()
+        return cls._make(row)
+
+
+def _flag_property(value):
+    return property(lambda self: (self.flags & value) != 0)
+
+
+for _flag in AccountCodeFlags:
+    setattr(AccountCodeRecord, _flag, _flag_property(getattr(AccountCode, _flag)._value))
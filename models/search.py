@@ -0,0 +1,171 @@
+import threading
+from collections import OrderedDict
+
+from peewee import Tuple
+
+from constants import FlagMatch, SortMode
+from . import db
+from .account_code import AccountCode, AccountCodeIndex
+from .flags import flag_condition, flag_index
+from .index import data_generation
+from .record import AccountCodeRecord
+
+# Columns of AccountCodeIndex that can be searched, besides account_code itself
+SEARCH_FIELDS = ["description", "notes", "personal_notes"]
+
+PAGE_SIZE = 200
+
+
+def search_phrase(terms, fields):
+    """Build an FTS5 query matching ANY word of terms in ANY of fields"""
+    return f"{{ {' '.join(fields)} }}: {terms}"
+
+
+def prefix_terms(text):
+    """
+    Quote each word of text so partially typed FTS5 syntax can't fail, and make the last word a prefix query, for
+    searching while the user types
+    """
+    words = [word.replace('"', '""') for word in text.split()]
+    terms = [f'"{word}"' for word in words]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _matching(query, terms, fields, cost_mask, flag_match):
+    """
+    Restrict query to codes matching terms in fields whose flags match cost_mask under flag_match, without terms only
+    the flags are filtered
+    """
+    query = query.where(flag_condition(cost_mask, flag_match))
+    if not terms:
+        return query
+    return query.join(AccountCodeIndex, on=(AccountCode.id == AccountCodeIndex.rowid)).where(
+        AccountCodeIndex.match(search_phrase(terms, fields))
+    )
+
+
+def _sort_key(sort_mode, terms):
+    if sort_mode == SortMode.RELEVANCE and terms:
+        return AccountCodeIndex.bm25()
+    elif sort_mode in (SortMode.RELEVANCE, SortMode.ACCOUNT_CODE):
+        # Nothing to rank a flag only search by, fall back to account code order
+        return AccountCode.sort_key
+    raise ValueError(f"Invalid SortMode {sort_mode}")
+
+
+def search_query(terms, fields, cost_mask, sort_mode, after=None, limit=None, flag_match=FlagMatch.ANY):
+    """
+    Query returning the AccountCodeRecord columns followed by the sort value for each match.
+
+    Results are ordered by (sort value, id) so they can be paged with a keyset, pass the page_cursor of the last row of
+    one page as after to get the rows following it without an OFFSET scan.
+    """
+    sort_key = _sort_key(sort_mode, terms)
+    query = _matching(AccountCodeRecord.select().select_extend(sort_key), terms, fields, cost_mask, flag_match)
+    if after is not None:
+        query = query.where(Tuple(sort_key, AccountCode.id) > Tuple(*after))
+    query = query.order_by(sort_key, AccountCode.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.tuples()
+
+
+def page_cursor(row):
+    """Keyset cursor for a row returned by search_query"""
+    return row[-1], row[0]
+
+
+def search_count(terms, fields, cost_mask, flag_match=FlagMatch.ANY):
+    if not terms:
+        return flag_index().count(cost_mask, flag_match)
+    return _matching(AccountCode.select(AccountCode.id), terms, fields, cost_mask, flag_match).count()
+
+
+class SearchCache:
+    """
+    Bounded LRU cache of search result pages, stored as lists of AccountCode ids.
+
+    Entries are only valid for one data generation of one database, the cache empties itself when an import or notes
+    edit advances it or another database is opened. Pages are fetched from worker threads so access is guarded by a lock.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.generation = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def validate(self, generation):
+        with self._lock:
+            if generation != self.generation:
+                self._entries.clear()
+                self.generation = generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+search_cache = SearchCache()
+
+
+def _fetch_records(ids):
+    records = {
+        record.id: record
+        for record in AccountCodeRecord.fetch(AccountCodeRecord.select().where(AccountCode.id.in_(ids)))
+    }
+    return [records[record_id] for record_id in ids if record_id in records]
+
+
+def search_page(
+    terms, fields, cost_mask, sort_mode, after=None, limit=PAGE_SIZE, flag_match=FlagMatch.ANY, cache=search_cache
+):
+    """
+    Return one page of AccountCodeRecords and the cursor for the next page, or None when this is the last page. Pages
+    are cached by their id lists, keyed on the normalized phrase, fields, flag filter, sort mode and position.
+
+    Without terms the flags alone are filtered by the in memory FlagIndex, pages are in account code order.
+    """
+    if not terms:
+        ids, cursor = flag_index().match_ids(cost_mask, flag_match, after, limit)
+        return _fetch_records(ids), cursor
+
+    # Generations restart for every database, two of them may be at the same one
+    cache.validate((db.database, data_generation()))
+    key = (" ".join(terms.split()), frozenset(fields), cost_mask, flag_match, sort_mode, after, limit)
+    entry = cache.get(key)
+    if entry is None:
+        rows = list(search_query(terms, fields, cost_mask, sort_mode, after, limit, flag_match))
+        cursor = page_cursor(rows[-1]) if len(rows) == limit else None
+        records = [AccountCodeRecord._make(row[:-1]) for row in rows]
+        cache.put(key, ([record.id for record in records], cursor))
+        return records, cursor
+
+    ids, cursor = entry
+    return _fetch_records(ids), cursor
@@ -0,0 +1,70 @@
+import sys
+from array import array
+
+from . import db
+from .account_code import AccountCode
+from .record import RECORD_FIELDS, AccountCodeRecord
+
+# Catalog columns held in memory are the RECORD_FIELDS, personal notes are the only user editable data so they always
+# stay on disk
+INTERNED_FIELDS = ["uom", "uom2", "metric_uom", "metric_uom2"]
+
+
+class CatalogSnapshot:
+    """
+    Read only, column oriented copy of the catalog.
+
+    Rows are stored in sort_key order, numeric columns in typed arrays and the unit of measure columns as interned
+    strings since only a handful of distinct units exist. Tree building and detail display can be served from memory,
+    flag filtering already is by the shared flag_index. The snapshot must be reloaded after an import.
+    """
+
+    def __init__(self, rows=()):
+        # Transpose once, building each column in a single pass is much faster than appending value by value
+        columns = dict(zip(RECORD_FIELDS, zip(*rows))) or {field: () for field in RECORD_FIELDS}
+        self.ids = array("q", columns.pop("id"))
+        self.levels = array("B", columns.pop("level"))
+        self.flags = array("H", columns.pop("_flags"))
+        self.columns = {field: list(values) for field, values in columns.items()}
+        for field in INTERNED_FIELDS:
+            self.columns[field] = [sys.intern(value) if value else value for value in self.columns[field]]
+
+        self.positions = {account_code: position for position, account_code in enumerate(self.columns["account_code"])}
+        self.children = {}
+        for position, parent_code in enumerate(self.columns["parent_code"]):
+            self.children.setdefault(parent_code, []).append(position)
+
+    @classmethod
+    def load(cls):
+        query = AccountCodeRecord.select().order_by(AccountCode.sort_key)
+        # The raw cursor skips peewee's per value conversion, every column is already stored in its Python type
+        return cls(db.execute(query).fetchall())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, account_code):
+        return account_code in self.positions
+
+    def value(self, position, field):
+        if field == "id":
+            return self.ids[position]
+        if field == "level":
+            return self.levels[position]
+        if field == "_flags":
+            return self.flags[position]
+        return self.columns[field][position]
+
+    def child_positions(self, account_code=None):
+        """Positions of the children of account_code, or of the top level codes when account_code is None"""
+        return self.children.get(account_code, [])
+
+    def has_children(self, account_code):
+        return account_code in self.children
+
+    def record(self, position):
+        return AccountCodeRecord._make(self.value(position, field) for field in RECORD_FIELDS)
+
+    def get(self, account_code):
+        """Build the record for account_code from memory without querying the database"""
+        return self.record(self.positions[account_code])
@@ -0,0 +1,53 @@
+from array import array
+from bisect import bisect_right
+
+DEFAULT_LIMIT = 50
+SEPARATOR = "\0"
+
+
+class TypeAheadIndex:
+    """
+    Precomputed search text for substring type-ahead over "code - description" labels.
+
+    Every label is lowercased once and joined into a single string, so a query is a handful of str.find calls that
+    run in C instead of a Python loop over every label. A bisect over the label start offsets maps a hit back to its
+    label. Searches stop as soon as limit matches are found and keep the order the items were given in.
+    """
+
+    def __init__(self, items=()):
+        self.codes = []
+        self.labels = []
+        lowered = []
+        self._starts = array("L")
+        offset = 0
+        for account_code, description in items:
+            label = f"{account_code} - {description}"
+            self.codes.append(account_code)
+            self.labels.append(label)
+            # Lowercase each label on its own, the length can change for some characters
+            lowered_label = label.lower()
+            lowered.append(lowered_label)
+            self._starts.append(offset)
+            offset += len(lowered_label) + len(SEPARATOR)
+        self._text = SEPARATOR.join(lowered)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Return the positions of at most limit labels containing query, ignoring case"""
+        query = query.lower()
+        if SEPARATOR in query:
+            return []
+        text = self._text
+        starts = self._starts
+        matches = []
+        hit = text.find(query)
+        while hit != -1 and len(matches) < limit:
+            position = bisect_right(starts, hit) - 1
+            matches.append(position)
+            if position + 1 >= len(starts):
+                break
+            # Continue from the next label so each label is only matched once
+            hit = text.find(query, starts[position + 1])
+        return matches
@@ -2,5 +2,6 @@ from .base_popup import BasePopup
 from .about import AboutPopup
 from .notes_export import ExportPopup
 from .notes_import import ImportPopup
+from .progress import ProgressPopup
 
-__all__ = ["BasePopup", "AboutPopup", "ExportPopup", "ImportPopup"]
+__all__ = ["BasePopup", "AboutPopup", "ExportPopup", "ImportPopup", "ProgressPopup"]
@@ -11,7 +11,7 @@ class ExportPopup(BasePopup):
     def __init__(self, parent):
         super().__init__(parent)
         self.title("Export Personal Notes")
-        self.geometry("600x120")
+        self.geometry("600x170")
         self.resizable(False, False)
 
         self.grid = ttk.Frame(self)
@@ -36,6 +36,18 @@ class ExportPopup(BasePopup):
         self.date_entry = DateEntry(self.grid, borderwidth=2, firstweekday="sunday")
         self.date_entry.grid(row=2, column=1, sticky=tk.EW, columnspan=2)
 
+        # Filters on the annotated entries imported from other exports
+        self.only_author_var = tk.BooleanVar(value=False)
+        self.only_author_check = ttk.Checkbutton(
+            self.grid, text="Exclude notes imported from other authors", variable=self.only_author_var
+        )
+        self.only_author_check.grid(row=3, column=1, sticky=tk.W, columnspan=2)
+        self.since_var = tk.BooleanVar(value=False)
+        self.since_check = ttk.Checkbutton(self.grid, text="Exclude notes dated before:", variable=self.since_var)
+        self.since_check.grid(row=4, column=0, sticky=tk.E)
+        self.since_entry = DateEntry(self.grid, borderwidth=2, firstweekday="sunday")
+        self.since_entry.grid(row=4, column=1, sticky=tk.EW, columnspan=2)
+
         self.grid.columnconfigure(0, weight=1)
         self.grid.columnconfigure(1, weight=4)
 
@@ -67,5 +79,7 @@ class ExportPopup(BasePopup):
             "file": self.file_entry.get(),
             "author": self.author_entry.get(),
             "date": self.date_entry.get(),
+            "only_author": self.only_author_var.get(),
+            "since": self.since_entry.get_date() if self.since_var.get() else None,
         }
         self.destroy()
@@ -0,0 +1,41 @@
+import tkinter as tk
+from tkinter import ttk
+
+from popups import BasePopup
+
+
+class ProgressPopup(BasePopup):
+    def __init__(self, parent, title, message, on_cancel=None):
+        super().__init__(parent)
+        self.title(title)
+        self.geometry("300x120")
+        self.resizable(False, False)
+        self.cancel_command = on_cancel
+
+        self.progress_label = ttk.Label(self, text=message)
+        self.progress_label.pack(pady=10)
+        self.progress_bar = ttk.Progressbar(self, mode="determinate")
+        self.progress_bar.pack(fill=tk.X, padx=20, pady=5)
+        self.progress_bar["value"] = 0
+        self.cancel_button = ttk.Button(self, text="Cancel", command=self.on_cancel)
+        self.cancel_button.pack(pady=5)
+        self.protocol("WM_DELETE_WINDOW", self.on_cancel)
+
+        self.center_window(parent)
+        self.deiconify()  # BasePopup starts withdrawn, so we need to deiconify it
+        # Modal while the task runs, the main window would otherwise write to the database the task holds locked
+        self.transient(parent)
+        self.grab_set()
+
+    def update_progress(self, message, percent):
+        self.progress_label["text"] = message
+        self.progress_bar["value"] = percent
+
+    def on_cancel(self):
+        # The popup stays open until the task acknowledges the cancellation
+        if self.cancel_command:
+            self.progress_label["text"] = "Cancelling..."
+            self.cancel_button.config(state="disabled")
+            self.cancel_command()
+        else:
+            super().on_cancel()
@@ -0,0 +1,5 @@
+from .catalog import CatalogService, CatalogStats, OpenResult
+from .notes import NotesService
+from .search import SearchRequest, SearchService
+
+__all__ = ["CatalogService", "CatalogStats", "OpenResult", "NotesService", "SearchRequest", "SearchService"]
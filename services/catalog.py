@@ -0,0 +1,169 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from peewee import fn
+
+from constants import AccountCodeFlags
+from models import (
+    DEFAULT_BATCH_SIZE,
+    FLAG_VALUES,
+    AccountCode,
+    AccountCodeRecord,
+    CatalogSnapshot,
+    db,
+    ensure_index,
+    export_account_codes,
+    flag_index,
+    import_account_codes,
+    index_is_current,
+    merge_account_codes,
+    migrate,
+    rebuild_index,
+    schema_version,
+)
+
+
+@dataclass
+class OpenResult:
+    path: Path
+    migrated: list[int] = field(default_factory=list)  # schema versions applied while opening
+    reindexed: bool = False  # the search index was stale and rebuilt
+
+
+@dataclass
+class CatalogStats:
+    database: str
+    size_bytes: int
+    schema_version: int
+    search_index_current: bool
+    account_codes: int
+    personal_notes: int
+    levels: dict[int, int] = field(default_factory=dict)
+    flags: dict[str, int] = field(default_factory=dict)
+
+
+class CatalogService:
+    """
+    The catalog database and its account codes, without any UI.
+
+    Opens, upgrades and indexes the database, imports and exports account codes and serves the records the tree and
+    detail panels display. When a snapshot is loaded reads are answered from memory, it is reloaded after every import.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self.use_snapshot = False
+
+    @property
+    def path(self):
+        return Path(db.database) if db.database else None
+
+    def open(self, db_path, progress=None):
+        """
+        Connect to db_path, creating it if needed, then upgrade the schema and rebuild the search index if it is out of
+        date. progress(number, total, description) is called before each migration step.
+        """
+        self.close()
+        db.init(str(db_path), pragmas={"journal_mode": "wal"})
+        db.connect()
+        migrated = migrate(progress=progress)
+        # Only rebuild the search index if it is out of date with the account codes
+        reindexed = ensure_index()
+        self.load_snapshot()
+        return OpenResult(path=Path(db_path).absolute(), migrated=migrated, reindexed=reindexed)
+
+    def close(self):
+        # Writes commit as they happen, there is no transaction left to finish
+        if not db.is_closed():
+            db.close()
+
+    def load_snapshot(self):
+        # Optionally serve the read only catalog data from memory
+        self.snapshot = CatalogSnapshot.load() if self.use_snapshot else None
+
+    def is_empty(self):
+        return not AccountCode.select().exists()
+
+    #########################################################################
+    # Import, export and the search index
+    #########################################################################
+
+    def import_account_codes(self, csv_path, merge=False, batch_size=DEFAULT_BATCH_SIZE, progress=None, cancel=None):
+        """
+        Replace the catalog with an account code CSV or, with merge, apply only the codes that changed. Arguments are
+        those of import_account_codes, returns its ImportResult.
+        """
+        load = merge_account_codes if merge else import_account_codes
+        result = load(csv_path, batch_size=batch_size, progress=progress, cancel=cancel)
+        self.load_snapshot()
+        return result
+
+    def export_account_codes(self, file_path, progress=None, cancel=None):
+        return export_account_codes(file_path, progress=progress, cancel=cancel)
+
+    def ensure_index(self):
+        """Rebuild the search index only if it is stale, returns True if a rebuild was needed"""
+        return ensure_index()
+
+    def rebuild_index(self):
+        rebuild_index()
+
+    #########################################################################
+    # Records
+    #########################################################################
+
+    def get(self, account_code):
+        """AccountCodeRecord for account_code, from the snapshot if loaded"""
+        if self.snapshot is not None and account_code in self.snapshot:
+            return self.snapshot.get(account_code)
+        return AccountCodeRecord.get(account_code)
+
+    def records(self):
+        """Every AccountCodeRecord in account code order, parents before their children"""
+        if self.snapshot is not None:
+            return (self.snapshot.record(position) for position in range(len(self.snapshot)))
+        return AccountCodeRecord.fetch(AccountCodeRecord.select().order_by(AccountCode.sort_key))
+
+    def labels(self):
+        """(account_code, description) of every code in account code order"""
+        if self.snapshot is not None:
+            columns = self.snapshot.columns
+            return zip(columns["account_code"], columns["description"])
+        return db.execute(
+            AccountCode.select(AccountCode.account_code, AccountCode.description).order_by(AccountCode.sort_key)
+        )
+
+    def child_records(self, parent=None):
+        """(AccountCodeRecord, has_children) for each child of parent, or the top level codes when parent is None"""
+        if self.snapshot is not None:
+            for position in self.snapshot.child_positions(parent):
+                record = self.snapshot.record(position)
+                yield record, self.snapshot.has_children(record.account_code)
+            return
+
+        Child = AccountCode.alias()
+        has_children = fn.EXISTS(Child.select(Child.id).where(Child.parent_code == AccountCode.account_code))
+        query = AccountCodeRecord.select().select_extend(has_children)
+        if parent:
+            query = query.where(AccountCode.parent_code == parent)
+        else:
+            query = query.where(AccountCode.parent_code.is_null())
+        for row in db.execute(query.order_by(AccountCode.sort_key)):
+            yield AccountCodeRecord._make(row[:-1]), bool(row[-1])
+
+    def stats(self):
+        levels = AccountCode.select(AccountCode.level, fn.COUNT(AccountCode.id)).group_by(AccountCode.level)
+        notes = AccountCode.select().where(
+            AccountCode.personal_notes.is_null(False) & (AccountCode.personal_notes != "")
+        )
+        index = flag_index()
+        return CatalogStats(
+            database=str(self.path.absolute()),
+            size_bytes=self.path.stat().st_size,
+            schema_version=schema_version(),
+            search_index_current=index_is_current(),
+            account_codes=len(index),
+            personal_notes=notes.count(),
+            levels=dict(sorted(db.execute(levels))),
+            flags={flag: index.count(FLAG_VALUES[flag]) for flag in AccountCodeFlags},
+        )
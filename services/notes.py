@@ -0,0 +1,30 @@
+from models import AccountCode, export_notes, import_notes
+
+
+class NotesService:
+    """Personal notes, the one part of the catalog the user edits, and their import and export"""
+
+    @staticmethod
+    def normalize(text):
+        """Notes as stored from the text of an editor, None when there is nothing but whitespace"""
+        return None if not text or text.isspace() else text.rstrip()
+
+    def get(self, account_code):
+        # Records don't carry personal notes, they are the only editable column and always read fresh from disk.
+        # Notes are keyed by account code, a full import gives every code a new id
+        query = AccountCode.select(AccountCode.personal_notes).where(AccountCode.account_code == account_code)
+        return query.scalar()
+
+    def save(self, account_code, notes):
+        AccountCode.update(personal_notes=notes).where(AccountCode.account_code == account_code).execute()
+
+    def has_notes(self):
+        return AccountCode.select().where(AccountCode.personal_notes.is_null(False)).exists()
+
+    def import_notes(self, file_path, overwrite=False, annotate=False):
+        """Apply a notes CSV or JSON export, returns a NotesImportResult, see models.import_notes"""
+        return import_notes(file_path, overwrite=overwrite, annotate=annotate)
+
+    def export_notes(self, file_path, author=None, export_date=None, only_author=False, since=None):
+        """Write the notes to a CSV or JSON file, returns a NotesExportResult, see models.export_notes"""
+        return export_notes(file_path, author=author, export_date=export_date, only_author=only_author, since=since)
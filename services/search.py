@@ -0,0 +1,86 @@
+from dataclasses import dataclass
+
+from constants import FlagMatch, SortMode
+from models import (
+    PAGE_SIZE,
+    SEARCH_FIELDS,
+    AccountCodeRecord,
+    db,
+    flag_mask,
+    prefix_terms,
+    search_cache,
+    search_count,
+    search_page,
+    search_query,
+)
+
+
+@dataclass(frozen=True)
+class SearchRequest:
+    """
+    A search as the user states it. text is FTS5 syntax, or with live the words typed so far. flags are AccountCodeFlags
+    names combined by flag_match, None leaves the flags unfiltered while an empty selection under ANY matches nothing.
+    """
+
+    text: str
+    fields: tuple[str, ...] = tuple(SEARCH_FIELDS)
+    flags: tuple[str, ...] | None = None
+    flag_match: FlagMatch = FlagMatch.ANY
+    sort_mode: SortMode = SortMode.RELEVANCE
+    live: bool = False
+
+    @property
+    def terms(self):
+        text = self.text.strip()
+        return prefix_terms(text) if self.live else text
+
+    @property
+    def cost_mask(self):
+        return flag_mask(self.flags or ())
+
+    @property
+    def match(self):
+        # An empty mask matches every code under ALL
+        return FlagMatch.ALL if self.flags is None else self.flag_match
+
+    @property
+    def is_empty(self):
+        """Nothing but the text narrows the search and there is no text"""
+        return not self.terms and self.flags is None
+
+
+class SearchService:
+    """Full text and flag searches over the catalog, paged and cached, safe to call from worker threads"""
+
+    def __init__(self, cache=search_cache):
+        self.cache = cache
+
+    def page(self, request, after=None, limit=PAGE_SIZE):
+        """(AccountCodeRecords, cursor for the next page or None) of one page of results, see search_page"""
+        return search_page(
+            request.terms,
+            list(request.fields),
+            request.cost_mask,
+            request.sort_mode,
+            after,
+            limit,
+            request.match,
+            cache=self.cache,
+        )
+
+    def count(self, request):
+        return search_count(request.terms, list(request.fields), request.cost_mask, request.match)
+
+    def results(self, request, limit=None):
+        """Stream every result, up to limit, as AccountCodeRecords without caching them"""
+        query = search_query(
+            request.terms,
+            list(request.fields),
+            request.cost_mask,
+            request.sort_mode,
+            limit=limit,
+            flag_match=request.match,
+        )
+        # The record columns followed by the sort value
+        for row in db.execute(query):
+            yield AccountCodeRecord._make(row[:-1])
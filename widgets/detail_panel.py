@@ -2,15 +2,18 @@ import tkinter as tk
 from tkinter import BooleanVar, ttk
 
 from constants import AccountCodeFields, AccountCodeFlags
-from models import AccountCode
+from models import AccountCodeRecord
 
 
 class DetailView(ttk.Frame):
-    def __init__(self, parent, *args, **kwargs):
+    def __init__(self, parent, notes, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
+        # NotesService the personal notes are read and saved through
+        self.notes = notes
         # Populate the detail view with labels, values, and checkboxes
         self.detail_widgets = {}
         self.current_account_code = None
+        self.current_personal_notes = None
 
         for i, field in enumerate(AccountCodeFields):
             # Create a gap for the description field
@@ -65,18 +68,17 @@ class DetailView(ttk.Frame):
 
     def save_personal_notes(self, event=None):
         if self.current_account_code:
-            notes = self.pnotes_text.get("1.0", tk.END)
-            if notes.isspace():
-                notes = None
-            else:
-                notes = notes.rstrip()
-            self.current_account_code.personal_notes = notes
-            self.current_account_code.save()
+            notes = self.notes.normalize(self.pnotes_text.get("1.0", tk.END))
+            # Only write real edits, every write advances the data generation and invalidates cached searches
+            if notes != self.current_personal_notes:
+                self.notes.save(self.current_account_code.account_code, notes)
+                self.current_personal_notes = notes
 
-    def update_details(self, acct_code: AccountCode):
+    def update_details(self, acct_code: AccountCodeRecord):
         self.save_personal_notes(None)
 
         self.current_account_code = acct_code
+        self.current_personal_notes = self.notes.get(acct_code.account_code)
         for field, widget in self.detail_widgets.items():
             if isinstance(widget, BooleanVar):
                 widget.set(getattr(self.current_account_code, field))
@@ -95,5 +97,22 @@ class DetailView(ttk.Frame):
         self.notes_text.config(state="disabled")
 
         self.pnotes_text.delete("1.0", tk.END)
-        if self.current_account_code.personal_notes:
-            self.pnotes_text.insert(tk.END, str(self.current_account_code.personal_notes))
+        if self.current_personal_notes:
+            self.pnotes_text.insert(tk.END, str(self.current_personal_notes))
+
+    def clear(self):
+        """Show no account code, without saving the personal notes being edited"""
+        self.current_account_code = None
+        self.current_personal_notes = None
+        for widget in self.detail_widgets.values():
+            if isinstance(widget, BooleanVar):
+                widget.set(False)
+            else:
+                widget.config(state="normal")
+                widget.delete("1.0", tk.END)
+                widget.config(state="disabled")
+
+        self.notes_text.config(state="normal")
+        self.notes_text.delete("1.0", tk.END)
+        self.notes_text.config(state="disabled")
+        self.pnotes_text.delete("1.0", tk.END)
@@ -1,23 +1,27 @@
 import tkinter as tk
 from tkinter import ttk
 
-from bitarray import bitarray
-from bitarray.util import ba2int
-
-from constants import AccountCodeLevelColoring, SortMode
-from models import AccountCode, AccountCodeIndex
+from constants import AccountCodeLevelColoring, FlagMatch, SortMode
+from services import SearchRequest
+from workers import CountWorker, SearchWorker
 from .placeholder_entry import PlaceholderEntry
 
+LOAD_MORE_AT = 0.9  # fetch the next page once the list is scrolled this far down
+LIVE_SEARCH_DELAY = 200  # ms to wait after the last keystroke before searching
+
 
 class SearchView(ttk.Frame):
-    def __init__(self, parent, *args, **kwargs):
+    def __init__(self, parent, search, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
+        # SearchService the searches run through
+        self.search = search
 
         self.search_frame = ttk.Frame(self, relief=tk.SUNKEN, padding=5)
         self.search_frame.pack(side=tk.TOP, fill=tk.X)
 
         self.search_term = PlaceholderEntry(self.search_frame, "Search Term")
         self.search_term.bind("<Return>", self._search)
+        self.search_term.bind("<KeyRelease>", self.on_key_release)
         self.search_term.pack(fill=tk.X)
 
         self.search_desc_var = tk.BooleanVar()
@@ -39,9 +43,32 @@ class SearchView(ttk.Frame):
         self.search_district.pack(fill=tk.X)
         self.search_personal.pack(fill=tk.X)
 
+        # Search as you type, debounced and using FTS5 prefix queries for the word being typed
+        self.live_search_var = tk.BooleanVar(value=True)
+        self.live_search = tk.Checkbutton(
+            self.search_frame, text="Search as you type", anchor=tk.W, variable=self.live_search_var
+        )
+        self.live_search.pack(fill=tk.X)
+        self._live_search_job = None
+
         self.cost_frame = ttk.Frame(self, relief=tk.SUNKEN, padding=5)
         self.cost_frame.pack(fill=tk.X)
         self.cost_label = ttk.Label(self.cost_frame, text="Cost Categories")
+        # How the selected categories combine, codes with any, all or none of them
+        self.cost_match_frame = ttk.Frame(self.cost_frame)
+        self.cost_match_label = ttk.Label(self.cost_match_frame, text="Match")
+        self.cost_match_label.pack(side=tk.LEFT, padx=5)
+        self.flag_match = tk.StringVar()
+        self.flag_match_combo = ttk.Combobox(
+            self.cost_match_frame,
+            state="readonly",
+            textvariable=self.flag_match,
+            values=["Any", "All", "None"],
+            width=6,
+        )
+        self.flag_match_combo.current(0)
+        self.flag_match_combo.pack(side=tk.LEFT)
+        self.flag_match_combo.bind("<<ComboboxSelected>>", self._search)
         self.cost_div = ttk.Separator(self.cost_frame, orient=tk.HORIZONTAL)
         self.cost_labor_var = tk.BooleanVar(value=True)
         self.cost_labor = tk.Checkbutton(self.cost_frame, text="Labor", variable=self.cost_labor_var)
@@ -64,7 +91,8 @@ class SearchView(ttk.Frame):
         self.cost_ga_var = tk.BooleanVar()
         self.cost_ga = tk.Checkbutton(self.cost_frame, text="G&A", variable=self.cost_ga_var)
 
-        self.cost_label.grid(row=0, column=0, columnspan=3, sticky=tk.W)
+        self.cost_label.grid(row=0, column=0, columnspan=2, sticky=tk.W)
+        self.cost_match_frame.grid(row=0, column=2, sticky=tk.E)
         self.cost_div.grid(row=1, column=0, columnspan=3, sticky=tk.EW)
         self.cost_labor.grid(row=2, column=0, sticky=tk.W)
         self.cost_equip.grid(row=3, column=0, sticky=tk.W)
@@ -101,74 +129,161 @@ class SearchView(ttk.Frame):
         self.results_list = ttk.Treeview(self.results_frame, selectmode="browse")
 
         self.scrollbar = ttk.Scrollbar(self.results_frame, orient="vertical", command=self.results_list.yview)
-        self.results_list.configure(yscrollcommand=self.scrollbar.set)
+        self.results_list.configure(yscrollcommand=self.on_results_scroll)
 
         self.results_list.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
         self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.results_frame.pack(expand=True, fill=tk.BOTH)
 
-    def _search(self, event=None):
-        # TODO: find a better way to call this (event?)
-        AccountCodeIndex.rebuild()
-        AccountCodeIndex.optimize()
-        search_terms = self.search_term.get()
+        # Searches run in the background, results and a summary for the status bar are streamed back
+        self.search_worker = None
+        self.count_worker = None
+        self.request = None
+        self.next_cursor = None
+        self.result_total = None
+        self.first_page_elapsed = 0.0
+        self.status_command = None
+        # AccountCodeRecord of every result in the list, by account code
+        self.records = {}
+
+    def on_key_release(self, event):
+        if not self.live_search_var.get() or event.keysym == "Return":
+            return
+        if self._live_search_job is not None:
+            self.after_cancel(self._live_search_job)
+        self._live_search_job = self.after(LIVE_SEARCH_DELAY, self._search, None, True)
+
+    def _search(self, event=None, live=False):
+        if self._live_search_job is not None:
+            self.after_cancel(self._live_search_job)
+            self._live_search_job = None
+        search_terms = self.search_term.get().strip()
+        if live and search_terms == "":
+            return
         search_locations = {
-            "Description": self.search_desc_var.get(),
-            "Notes": self.search_district_var.get(),
-            "Personal_Notes": self.search_personal_var.get(),
+            "description": self.search_desc_var.get(),
+            "notes": self.search_district_var.get(),
+            "personal_notes": self.search_personal_var.get(),
         }
-        search_costs = bitarray(
-            [
-                self.cost_ga_var.get(),  # 256
-                self.cost_contingency_var.get(),  # 128
-                self.cost_fixed_var.get(),  # 64
-                self.cost_subcontract_var.get(),  # 32
-                self.cost_materials_var.get(),  # 16
-                self.cost_supplies_var.get(),  # 8
-                self.cost_fom_equip_var.get(),  # 4
-                self.cost_equip_var.get(),  # 2
-                self.cost_labor_var.get(),  # 1
-            ]
+        search_costs = {
+            "has_labor_cost": self.cost_labor_var.get(),
+            "has_const_eqp_cost": self.cost_equip_var.get(),
+            "has_fom_rented_eqp_cost": self.cost_fom_equip_var.get(),
+            "has_supplies_cost": self.cost_supplies_var.get(),
+            "has_materials_cost": self.cost_materials_var.get(),
+            "has_subcontract_cost": self.cost_subcontract_var.get(),
+            "has_fixed_fees_and_services_cost": self.cost_fixed_var.get(),
+            "has_contingency_allowances_cost": self.cost_contingency_var.get(),
+            "has_ga_cost": self.cost_ga_var.get(),
+        }
+
+        # Search for ANY word of the phrase in ANY selected field, keeping the codes with ANY, ALL or NONE of the
+        # selected cost types depending on flag_match. With an empty phrase only the cost types are filtered
+        request = SearchRequest(
+            search_terms,
+            fields=tuple(field for field, selected in search_locations.items() if selected),
+            flags=tuple(flag for flag, selected in search_costs.items() if selected),
+            flag_match=FlagMatch(self.flag_match_combo.current()),
+            sort_mode=SortMode(self.sort_mode_combo.current()),
+            live=live,
         )
 
-        search_phrase = f"{{ {" ".join([key for key, value in search_locations.items() if value])} }}: {search_terms}"
+        # A newer search replaces the one still running
+        self.cancel_search()
+        self.results_list.delete(*self.results_list.get_children())
+        self.records = {}
+        self.set_status("Searching...")
+
+        # Results are fetched a page at a time as the list is scrolled, the total is counted alongside the first page
+        self.request = request
+        self.next_cursor = None
+        self.result_total = None
+        self.fetch_page()
 
-        search_costs = ba2int(search_costs)
+        count_worker = CountWorker(self.search, request)
+        self.count_worker = count_worker
+        count_worker.start()
+        count_worker.poll(self, lambda kind, *args: self.on_count_event(count_worker, kind, *args))
 
-        # search_terms: list of strings to search for in the account code, search for ANY word in ANY selected field
-        # search_costs: bitarray of cost types to search for, & the bit array with the _flags and return if > 0
-        search_mode = SortMode(self.sort_mode_combo.current())
-        if search_terms == "":
-            print("Empty Search Phrase, no search attempted")
-            return
-        if search_mode == SortMode.RELEVANCE:
-            values = (
-                AccountCode.select(AccountCode.account_code, AccountCode.description, AccountCode.level)
-                .join(AccountCodeIndex, on=(AccountCode.id == AccountCodeIndex.rowid))
-                .where((AccountCodeIndex.match(search_phrase)) & (AccountCode._flags.bin_and(search_costs)))
-                .order_by(AccountCodeIndex.bm25())
-            )
-        elif search_mode == SortMode.ACCOUNT_CODE:
-            values = (
-                AccountCode.select(AccountCode.account_code, AccountCode.description, AccountCode.level)
-                .join(AccountCodeIndex, on=(AccountCode.id == AccountCodeIndex.rowid))
-                .where((AccountCodeIndex.match(search_phrase)) & (AccountCode._flags.bin_and(search_costs)))
-                .order_by(AccountCode.account_code)
-            )
-        else:
-            print("Invalid SortMode, defaulting to empty list")
-            values = []
+    def cancel_search(self):
+        for worker in (self.search_worker, self.count_worker):
+            if worker is not None:
+                worker.cancel()
+        self.search_worker = None
+        self.count_worker = None
 
+    def clear_results(self):
+        """Drop the results, after an import they are records of a catalog that no longer exists"""
+        self.cancel_search()
         self.results_list.delete(*self.results_list.get_children())
+        self.records = {}
+        self.request = None
+        self.next_cursor = None
+        self.result_total = None
+
+    def fetch_page(self, after=None):
+        worker = SearchWorker(self.search, self.request, after=after)
+        self.search_worker = worker
+        worker.start()
+        worker.poll(self, lambda kind, *args: self.on_search_event(worker, kind, *args), max_events=1)
+
+    def load_more(self):
+        if self.next_cursor is not None and self.search_worker is None:
+            after = self.next_cursor
+            self.next_cursor = None
+            self.fetch_page(after)
+
+    def on_results_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(last) >= LOAD_MORE_AT:
+            self.load_more()
+
+    def on_search_event(self, worker, kind, *args):
+        if worker is not self.search_worker:
+            return  # results from a search that has been replaced
+
+        if kind == "rows":
+            for record in args[0]:
+                self.records[record.account_code] = record
+                self.results_list.insert(
+                    "",
+                    "end",
+                    iid=record.account_code,
+                    text=record.label,
+                    tags=(f"level{record.level}",),
+                )
+            return
+
+        self.search_worker = None
+        if kind == "done":
+            count, self.next_cursor, elapsed = args[0]
+            if worker.after is None:
+                self.first_page_elapsed = elapsed
+            self.update_result_status()
+            # Keep going if the page did not fill the list, there is nothing to scroll yet
+            if self.results_list.yview()[1] >= LOAD_MORE_AT:
+                self.load_more()
+        elif kind == "error":
+            self.set_status(f"Search failed: {args[0]}")
+
+    def on_count_event(self, worker, kind, *args):
+        if worker is not self.count_worker:
+            return
+        self.count_worker = None
+        if kind == "done":
+            self.result_total = args[0]
+            self.update_result_status()
+
+    def update_result_status(self):
+        if self.search_worker is not None and not self.results_list.get_children():
+            return  # still waiting on the first page
+        shown = len(self.results_list.get_children())
+        total = "?" if self.result_total is None else self.result_total
+        self.set_status(f"Showing {shown} of {total} results, first page in {self.first_page_elapsed:.3f}s")
 
-        for value in values:
-            self.results_list.insert(
-                "",
-                "end",
-                iid=value.account_code,
-                text=f"{value.account_code} - {value.description}",
-                tags=(f"level{value.level}",),
-            )
+    def set_status(self, message):
+        if self.status_command:
+            self.status_command(message)
 
     def configure_tree_backgrounds(self, value=None):
         for level, color in AccountCodeLevelColoring.items():
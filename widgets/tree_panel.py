@@ -3,12 +3,18 @@ from tkinter import ttk
 from tkinter.ttk import Style
 
 from constants import AccountCodeLevelColoring
-from models import AccountCode
+from models import TypeAheadIndex
+
+PLACEHOLDER_TAG = "placeholder"
+SEARCH_DELAY = 150  # ms to wait after the last keystroke before searching
+SEARCH_LIMIT = 50
 
 
 class TreePanel(ttk.Frame):
-    def __init__(self, parent, *args, **kwargs):
+    def __init__(self, parent, catalog, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
+        # CatalogService the codes are read from, it answers from its snapshot when one is loaded
+        self.catalog = catalog
         self.level_button_row = ttk.Frame(self)
         self.level_button_row.pack(fill=tk.X)
         self.collapse_all_button = ttk.Button(self.level_button_row, text="Collapse All", command=self.collapse_all)
@@ -25,28 +31,52 @@ class TreePanel(ttk.Frame):
         style = Style()
         style.layout("Treeview.Heading", [])
         self.tree = ttk.Treeview(self, selectmode="browse")
-        self.tree_items = []
+        # Built the first time the search box gets focus, most sessions never type in it
+        self.type_ahead = None
+        self._search_job = None
         self.tree.pack(fill=tk.BOTH, expand=True)
+        self.tree.bind("<<TreeviewOpen>>", self.on_open)
+
+        # In lazy mode only the top level is inserted up front, children are loaded the first time a node is opened
+        self.lazy = True
+        # AccountCodeRecord of every code inserted into the tree, by account code
+        self.records = {}
 
     def add_keyrelease_binding(self, event):
-        self.search_combobox.bind("<KeyRelease>", self.search)
+        self.type_ahead_index()
+        self.search_combobox.bind("<KeyRelease>", self.on_key_release)
 
     def remove_keyrelease_binding(self, event):
         self.search_combobox.unbind("<KeyRelease>")
 
-    def search(self, event):
+    def type_ahead_index(self):
+        if self.type_ahead is None:
+            self.type_ahead = TypeAheadIndex(self.catalog.labels())
+        return self.type_ahead
+
+    def on_key_release(self, event):
+        # Debounce, only search once typing pauses
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(SEARCH_DELAY, self.search, event)
+
+    def search(self, event=None):
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+            self._search_job = None
         if event == "<KeyPress>":
             if event.keysym == "BackSpace":
                 return
             cursor_index = self.search_combobox.index("insert")
             self.search_var.set(self.search_var.get()[: cursor_index + 1])
             return
-        query = self.search_var.get().lower()
-        filtered_items = [item for item in self.tree_items if query in item.lower()]
-        self.search_combobox["values"] = filtered_items
+        type_ahead = self.type_ahead_index()
+        matches = type_ahead.search(self.search_var.get(), limit=SEARCH_LIMIT)
+        self.search_combobox["values"] = [type_ahead.labels[match] for match in matches]
 
-        if filtered_items:
-            first_acct_code = filtered_items[0].split(" - ")[0]
+        if matches:
+            first_acct_code = type_ahead.codes[matches[0]]
+            self.reveal(first_acct_code)
             self.tree.selection_set(first_acct_code)
             self.tree.see(first_acct_code)
             self.tree.focus(first_acct_code)
@@ -54,35 +84,75 @@ class TreePanel(ttk.Frame):
     def populate_tree(self):
         # Clear the treeview in case there are existing items
         self.tree.delete(*self.tree.get_children())
-        self.tree_items = []
-
-        # Query the database and insert data into the treeview
-        for code in AccountCode.select():
-            acct_code = code.account_code.split(".")
-            if len(acct_code) > 1:
-                parent = ".".join(acct_code[:-1])
-            else:
-                parent = ""
-
-            self.tree.insert(
-                parent,
-                "end",
-                iid=code.account_code,
-                text=f"{code.account_code} - {code.description}",
-                tags=(f"level{code.level}",),
-            )
-            self.tree_items.append(f"{code.account_code} - {code.description}")
+        self.records = {}
+        # The codes changed, the type ahead index is rebuilt when next needed
+        self.type_ahead = None
+
+        if self.lazy:
+            self.load_children("")
+            return
+
+        # Insert every code, rows come in sort_key order so parents are always inserted before their children
+        for record in self.catalog.records():
+            self.insert_code(record.parent_code or "", record)
+
+    def insert_code(self, parent, record):
+        self.records[record.account_code] = record
+        self.tree.insert(
+            parent,
+            "end",
+            iid=record.account_code,
+            text=record.label,
+            tags=(f"level{record.level}",),
+        )
+
+    def load_children(self, parent):
+        """Insert the children of parent, giving each child with children of its own a placeholder to open"""
+        children = self.tree.get_children(parent)
+        if children and not self.tree.tag_has(PLACEHOLDER_TAG, children[0]):
+            return  # already loaded
+        self.tree.delete(*children)
+
+        for record, has_children in self.catalog.child_records(parent or None):
+            self.insert_code(parent, record)
+            if has_children:
+                self.tree.insert(record.account_code, "end", text="Loading...", tags=(PLACEHOLDER_TAG,))
+
+    def reveal(self, account_code):
+        """Load every ancestor of account_code so that it can be selected in lazy mode"""
+        if self.tree.exists(account_code):
+            return
+        parts = account_code.split(".")
+        self.load_children("")
+        for i in range(1, len(parts)):
+            ancestor = ".".join(parts[:i])
+            if not self.tree.exists(ancestor):
+                return
+            self.load_children(ancestor)
+
+    def on_open(self, event=None):
+        self.load_children(self.tree.focus())
 
     def configure_tree_backgrounds(self, value=None):
         for level, color in AccountCodeLevelColoring.items():
             self.tree.tag_configure(level, background=color if value else "")
 
-    def collapse_all(self, item=None):
-        for item in self.tree_items:
-            item_code = item.split(" - ")[0]
-            self.tree.item(item_code, open=False)
+    def walk(self, item=""):
+        """Yield every loaded item below item, skipping lazy loading placeholders"""
+        for child in self.tree.get_children(item):
+            if not self.tree.tag_has(PLACEHOLDER_TAG, child):
+                yield child
+                yield from self.walk(child)
+
+    def collapse_all(self):
+        for item in self.walk():
+            self.tree.item(item, open=False)
 
     def expand_all(self):
-        for item in self.tree_items:
-            item_code = item.split(" - ")[0]
-            self.tree.item(item_code, open=True)
+        if self.lazy:
+            # Every node is about to be shown, load the whole tree in one pass
+            self.lazy = False
+            self.populate_tree()
+            self.lazy = True
+        for item in self.walk():
+            self.tree.item(item, open=True)
@@ -0,0 +1,149 @@
+import queue
+import sqlite3
+import threading
+import time
+
+from models import PAGE_SIZE, OperationCancelled, db
+
+
+class Worker(threading.Thread):
+    """
+    Base class for background tasks.
+
+    The worker never touches Tk widgets, it posts (kind, *args) events to a queue which the main loop drains with
+    poll(). Progress events are throttled to one per progress_interval seconds so the GUI is not flooded. Cancelling
+    sets cancel_event and interrupts the statement running on the worker's connection.
+    """
+
+    def __init__(self, progress_interval=0.1):
+        super().__init__(daemon=True)
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.progress_interval = progress_interval
+        self._last_progress = 0.0
+        self.connection = None
+
+    def cancel(self):
+        self.cancel_event.set()
+        # Abort a query that is still running in SQLite, interrupt is safe to call from another thread
+        if self.connection is not None:
+            try:
+                self.connection.interrupt()
+            except sqlite3.ProgrammingError:
+                pass  # the task finished and closed its connection in the meantime
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def post(self, kind, *args):
+        self.events.put((kind, *args))
+
+    def post_progress(self, *args):
+        now = time.perf_counter()
+        if now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            self.post("progress", *args)
+
+    def run(self):
+        try:
+            # Each thread gets its own connection, close it when the task is finished
+            with db.connection_context():
+                self.connection = db.connection()
+                if self.cancelled:
+                    raise OperationCancelled("Cancelled before it started")
+                result = self.work()
+        except OperationCancelled:
+            self.post("cancelled")
+        except Exception as e:
+            # Interrupting a query surfaces as a database error, report it as a cancellation
+            self.post("cancelled" if self.cancelled else "error", e)
+        else:
+            self.post("done", result)
+
+    def work(self):
+        raise NotImplementedError
+
+    def poll(self, widget, handler, interval=50, max_events=None):
+        """
+        Drain pending events on the Tk thread, calling handler(kind, *args), until the task has finished. With
+        max_events only that many events are handled per call so the GUI can repaint between them.
+        """
+        handled = 0
+        while max_events is None or handled < max_events:
+            try:
+                kind, *args = self.events.get_nowait()
+            except queue.Empty:
+                break
+            handler(kind, *args)
+            handled += 1
+            if kind in ("done", "error", "cancelled"):
+                return
+        # Come straight back if events are still waiting, otherwise wait for the worker to produce more
+        widget.after(1 if not self.events.empty() else interval, self.poll, widget, handler, interval, max_events)
+
+
+class ImportWorker(Worker):
+    """Replaces the catalog with an account code CSV, or with merge only applies the codes that changed"""
+
+    def __init__(self, catalog, csv_path, batch_size, merge=False, **kwargs):
+        super().__init__(**kwargs)
+        self.catalog = catalog
+        self.csv_path = csv_path
+        self.batch_size = batch_size
+        self.merge = merge
+
+    def work(self):
+        return self.catalog.import_account_codes(
+            self.csv_path, self.merge, self.batch_size, progress=self.post_progress, cancel=self.cancel_event
+        )
+
+
+class ExportWorker(Worker):
+    """Streams the catalog to a CSV or JSON Lines file, gzip compressed when the name ends in .gz"""
+
+    def __init__(self, catalog, file_path, **kwargs):
+        super().__init__(**kwargs)
+        self.catalog = catalog
+        self.file_path = file_path
+
+    def work(self):
+        return self.catalog.export_account_codes(self.file_path, progress=self.post_progress, cancel=self.cancel_event)
+
+
+class SearchWorker(Worker):
+    """
+    Fetches one page of a SearchRequest's results on its own read only connection, streaming the AccountCodeRecords
+    back in chunks. The result is (row count, cursor for the next page or None, elapsed seconds).
+    """
+
+    def __init__(self, search, request, after=None, limit=PAGE_SIZE, chunk_size=50, **kwargs):
+        super().__init__(**kwargs)
+        self.search = search
+        self.request = request
+        self.after = after
+        self.limit = limit
+        self.chunk_size = chunk_size
+
+    def work(self):
+        start = time.perf_counter()
+        db.execute_sql("PRAGMA query_only = ON")
+        rows, cursor = self.search.page(self.request, self.after, self.limit)
+        for i in range(0, len(rows), self.chunk_size):
+            if self.cancelled:
+                raise OperationCancelled("Search cancelled")
+            self.post("rows", rows[i : i + self.chunk_size])
+        return len(rows), cursor, time.perf_counter() - start
+
+
+class CountWorker(Worker):
+    """Counts every match of a search, run alongside the first page so the total can be shown"""
+
+    def __init__(self, search, request, **kwargs):
+        super().__init__(**kwargs)
+        self.search = search
+        self.request = request
+
+    def work(self):
+        db.execute_sql("PRAGMA query_only = ON")
+        return self.search.count(self.request)